@@ -0,0 +1,367 @@
+"""Asyncio backend, for Python 3.5+.
+
+:func:`run` sends the load like :func:`boom.boom.run` and returns the
+same RunResults, without gevent: this module doesn't monkey patch
+anything, so it can be used from asyncio code through :func:`arun`.
+uvloop is used when it is installed.
+
+The calls are made by a minimal HTTP/1.1 client over asyncio streams,
+the same as the socket engine of :mod:`boom.engines`. Profiles, interval
+reports, output files and engines are not supported by this backend.
+"""
+import asyncio
+import logging
+import ssl
+from itertools import islice, repeat, takewhile
+
+from requests import RequestException
+
+from boom.engines import Response, Template, connection_error, serialize
+from boom.profile import arrivals
+from boom.results import RunResults
+from boom.util import monotonic, resolve_name
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+logger = logging.getLogger('boom')
+# seconds given to the calls in flight to finish once a -d run is over
+_DRAIN_TIMEOUT = 5
+
+
+class Client(object):
+    """Sends HTTP/1.1 calls over asyncio streams.
+
+    Idle connections are kept per host, up to *concurrency* of them. A
+    *resolver* spreads them over the addresses of the hosts.
+    """
+
+    def __init__(self, results=None, concurrency=1, keepalive=True,
+                 resolver=None):
+        self.results = results
+        self.concurrency = concurrency
+        self.keepalive = keepalive
+        self.resolver = resolver
+        self._idle = {}
+        self._ssl_context = None
+
+    def _record(self, phase, duration):
+        if self.results is not None:
+            self.results.phases[phase].append(duration)
+
+    async def _connect(self, target):
+        scheme, host, port = target
+        address = None
+        try:
+            if self.resolver is not None:
+                address = self.resolver.pick(host, port)
+            start = monotonic()
+            if scheme == 'https':
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                # the handshake happens in open_connection, there is no tls
+                # phase apart from the connect one.
+                reader, writer = await asyncio.open_connection(
+                    address or host, port, ssl=self._ssl_context,
+                    server_hostname=host)
+            else:
+                reader, writer = await asyncio.open_connection(
+                    address or host, port)
+        except (OSError, ssl.SSLError) as exc:
+            raise connection_error(exc, address)
+        self._record('connect', monotonic() - start)
+
+        if self.results is not None:
+            self.results.new_connections += 1
+        return reader, writer, address
+
+    async def _read_response(self, reader, method, start, address):
+        line = await reader.readline()
+        if not line:
+            raise EOFError('Connection closed by the server')
+        status = int(line.split(None, 2)[1])
+        headers = {}
+
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        self._record('ttfb', monotonic() - start)
+        start = monotonic()
+        keepalive = (self.keepalive and
+                     headers.get('connection', '').lower() != 'close')
+
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            content = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                line = await reader.readline()
+                size = int(line.split(b';', 1)[0], 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            # trailers
+            while await reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            content = b''.join(chunks)
+        elif 'content-length' in headers:
+            content = await reader.readexactly(
+                int(headers['content-length']))
+        else:
+            content = await reader.read()
+            keepalive = False
+
+        self._record('body', monotonic() - start)
+        return Response(status, headers, content, address), keepalive
+
+    async def request(self, method, url, headers=None, data=None,
+                      auth=None):
+        return await self.send(self.prepare(method, url, headers, data,
+                                            auth))
+
+    def prepare(self, method, url, headers=None, data=None, auth=None):
+        target, raw = serialize(method, url, headers, data, auth,
+                                self.keepalive)
+        return method, target, raw
+
+    async def send(self, prepared):
+        method, target, raw = prepared
+        idle = self._idle.setdefault(target, [])
+
+        while True:
+            reused = bool(idle)
+            if reused:
+                reader, writer, address = idle.pop()
+            else:
+                reader, writer, address = await self._connect(target)
+
+            try:
+                start = monotonic()
+                if isinstance(raw, tuple):
+                    writer.writelines(raw)
+                else:
+                    writer.write(raw)
+                await writer.drain()
+                response, keepalive = await self._read_response(
+                    reader, method, start, address)
+            except (OSError, EOFError, asyncio.IncompleteReadError,
+                    ValueError, IndexError) as exc:
+                writer.close()
+                if reused:
+                    # the server closed the idle connection, try again
+                    continue
+                raise connection_error(exc, address)
+            break
+
+        if reused and self.results is not None:
+            self.results.reused_connections += 1
+
+        if keepalive and len(idle) < self.concurrency:
+            idle.append((reader, writer, address))
+        else:
+            writer.close()
+        return response
+
+    def close(self):
+        for idle in self._idle.values():
+            for reader, writer, address in idle:
+                writer.close()
+        self._idle.clear()
+
+
+async def onecall(template, results, start=None):
+    """Performs a single call, like :func:`boom.boom.onecall`, counting
+    any exception in the errors table."""
+    if start is None:
+        start = monotonic()
+    else:
+        results.schedule_lag.append(max(0., monotonic() - start))
+
+    try:
+        if template.dynamic:
+            method, url, options = template.build()
+            res = await method(url, **options)
+        else:
+            res = await template.engine.send(template.prepared)
+        address = res.address
+        if template.post_hook is not None:
+            res = template.post_hook(res)
+    except Exception as exc:
+        if not isinstance(exc, RequestException):
+            # a bug of a hook or a data callable, see boom.boom.onecall
+            logger.debug('Call failed', exc_info=True)
+        results.record_error(exc, address=getattr(exc, 'address', None))
+    else:
+        results.record(res.status_code, monotonic() - start,
+                       address=address)
+    finally:
+        results.incr()
+
+
+async def worker(tasks, template, results):
+    """Performs a call for every item of *tasks*."""
+    for _ in tasks:
+        await onecall(template, results)
+
+
+def until(deadline):
+    """Yields until the monotonic clock reaches *deadline*."""
+    while monotonic() < deadline:
+        yield
+
+
+async def dispatch(schedule, concurrency, template, results, calls):
+    """Starts a call at every time given by *schedule*, with at most
+    *concurrency* calls in flight. The calls are added to *calls*."""
+    slots = asyncio.Semaphore(concurrency)
+
+    def done(call):
+        calls.discard(call)
+        slots.release()
+
+    for intended in schedule:
+        delay = intended - monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        call = asyncio.ensure_future(
+            onecall(template, results, start=intended))
+        calls.add(call)
+        call.add_done_callback(done)
+
+
+async def _run(res, url, num=1, duration=None, method='GET', data=None,
+               ct='text/plain', auth=None, concurrency=1, headers=None,
+               pre_hook=None, post_hook=None, keepalive=True, rate=None,
+               arrival='fixed', resolver=None):
+    if num is None and duration is None:
+        raise ValueError('A run needs a number of calls or a duration')
+
+    if headers is None:
+        headers = {}
+
+    if 'content-type' not in headers:
+        headers['Content-Type'] = ct
+
+    if isinstance(data, str) and data.startswith('py:'):
+        data = resolve_name(data[len('py:'):])
+
+    client = Client(res, concurrency, keepalive, resolver)
+    options = {'headers': headers}
+
+    if pre_hook is not None:
+        pre_hook = resolve_name(pre_hook)
+
+    if post_hook is not None:
+        post_hook = resolve_name(post_hook)
+
+    if data is not None:
+        options['data'] = data
+
+    if auth is not None:
+        options['auth'] = tuple(auth.split(':', 1))
+
+    template = Template(client, method.upper(), url, options, pre_hook,
+                        post_hook)
+    start = monotonic()
+    deadline = start + duration if num is None else None
+    calls = set()
+
+    try:
+        if rate is not None:
+            tasks = arrivals(rate, start, arrival == 'poisson')
+            if deadline is None:
+                tasks = islice(tasks, num)
+            else:
+                tasks = takewhile(lambda intended: intended < deadline, tasks)
+            await dispatch(tasks, concurrency, template, res, calls)
+        elif deadline is None:
+            tasks = repeat(None, num)
+            for i in range(min(concurrency, num)):
+                calls.add(asyncio.ensure_future(
+                    worker(tasks, template, res)))
+        else:
+            for i in range(concurrency):
+                calls.add(asyncio.ensure_future(
+                    worker(until(deadline), template, res)))
+
+        if calls:
+            if deadline is None:
+                await asyncio.wait(calls)
+            else:
+                # the calls in flight get a chance to finish and be counted.
+                __, pending = await asyncio.wait(
+                    calls, timeout=max(0, deadline - monotonic()) +
+                    _DRAIN_TIMEOUT)
+                if pending:
+                    res.dropped = len(pending)
+                    for call in pending:
+                        call.cancel()
+    finally:
+        res.total_time = monotonic() - start
+        for address in res.addresses.values():
+            address.total_time = res.total_time
+        client.close()
+
+    return res
+
+
+async def arun(url, num=1, duration=None, method='GET', data=None,
+               ct='text/plain', auth=None, concurrency=1, headers=None,
+               pre_hook=None, post_hook=None, keepalive=True,
+               keep_samples=False, rate=None, arrival='fixed',
+               resolver=None):
+    """Sends the load from the running event loop and returns its
+    RunResults.
+
+    The options are the ones of :func:`boom.boom.run`. Hooks are called
+    like with the gevent backend, post hooks get a
+    :class:`boom.engines.Response`.
+    """
+    res = RunResults(num, True, keep_samples)
+    return await _run(res, url, num, duration, method, data, ct, auth,
+                      concurrency, headers, pre_hook, post_hook, keepalive,
+                      rate, arrival, resolver)
+
+
+def new_event_loop():
+    """Returns a uvloop event loop when available, an asyncio one
+    otherwise."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def run(url, num=1, duration=None, method='GET', data=None, ct='text/plain',
+        auth=None, concurrency=1, headers=None, pre_hook=None,
+        post_hook=None, quiet=False, keepalive=True, keep_samples=False,
+        rate=None, arrival='fixed', resolver=None):
+    """Sends the load in a new event loop and returns its RunResults.
+
+    The options are the ones of :func:`boom.boom.run`. There is no
+    progress bar, *quiet* is only kept for compatibility.
+    """
+    res = RunResults(num, True, keep_samples)
+    loop = new_event_loop()
+    start = monotonic()
+
+    try:
+        loop.run_until_complete(_run(
+            res, url, num, duration, method, data, ct, auth, concurrency,
+            headers, pre_hook, post_hook, keepalive, rate, arrival,
+            resolver))
+    except KeyboardInterrupt:
+        # return whatever already got put into the result object.
+        res.total_time = monotonic() - start
+    finally:
+        loop.close()
+
+    return res
@@ -0,0 +1,124 @@
+"""Running loads from Python code.
+
+A :class:`LoadTest` runs a load in a greenlet, in the background of the
+calling code, and prints nothing. Its results come back as RunResults
+objects, for the whole run and for every interval as they end::
+
+    from boom.util import patch
+    patch()  # first thing, before importing anything else
+
+    from boom.api import LoadTest
+
+    test = LoadTest('http://localhost:8080/', duration=10, concurrency=20,
+                    interval=1)
+    test.start()
+    for elapsed, interval in test:
+        print(elapsed, interval.status_code_counter, len(interval.errors))
+    stats = test.stats()
+
+Importing boom doesn't monkey patch anything, :func:`boom.util.patch`
+does it once, and :meth:`LoadTest.start` calls it when nobody did. Many
+load tests can run one after the other in a process, at no extra cost.
+"""
+from gevent import spawn
+from gevent.queue import Queue
+
+from boom.boom import run
+from boom.results import _PERCENTILES, calc_stats
+from boom.util import patch
+
+
+class LoadTest(object):
+    """A run of :func:`boom.boom.run` on *url*, with the *options* of
+    this function. A run given a ``duration`` and no ``num`` lasts for
+    this duration.
+
+    When *interval* is given, the results of every *interval* seconds are
+    given by iterating on the load test, and to *on_interval* when given,
+    as the arguments ``(results, elapsed)`` of the ``on_interval`` of
+    :func:`boom.boom.run`. Iterating yields ``(elapsed, results)`` tuples
+    and stops at the end of the run.
+    """
+
+    def __init__(self, url, interval=None, on_interval=None, **options):
+        self.url = url
+        self.interval = interval
+        self.on_interval = on_interval
+        self.options = options
+        if 'duration' in options:
+            options.setdefault('num', None)
+        self._greenlet = None
+        self._sending = False
+        self._queue = Queue()
+        self._results = None
+
+    @property
+    def running(self):
+        return self._greenlet is not None and not self._greenlet.ready()
+
+    def _run(self):
+        self._sending = True
+        try:
+            self._results = run(self.url, quiet=True,
+                                report_interval=self.interval,
+                                on_interval=self._report, **self.options)
+        except KeyboardInterrupt:
+            # stopped before the calls were sent
+            pass
+        finally:
+            self._queue.put(StopIteration)
+
+    def _report(self, results, elapsed):
+        self._queue.put((elapsed, results))
+        if self.on_interval is not None:
+            self.on_interval(results, elapsed)
+
+    def start(self):
+        """Starts sending the load and returns the load test."""
+        if self._greenlet is not None:
+            raise RuntimeError('The load test was already started')
+        patch()
+        self._greenlet = spawn(self._run)
+        return self
+
+    def stop(self):
+        """Stops the run, dropping the calls in flight, and returns its
+        RunResults."""
+        if self.running and self._sending:
+            # what run() does on a Ctrl-C
+            self._greenlet.kill(KeyboardInterrupt)
+        elif self.running:
+            self._greenlet.kill()
+            self._queue.put(StopIteration)
+        return self.results()
+
+    def results(self, timeout=None):
+        """Waits for the end of the run, up to *timeout* seconds, and
+        returns its RunResults. Returns None when it's not over."""
+        if self._greenlet is None:
+            raise RuntimeError('The load test was not started')
+        self._greenlet.join(timeout)
+        return self._results
+
+    def stats(self, percentiles=_PERCENTILES):
+        """Waits for the end of the run and returns its statistics, as a
+        :class:`boom.results.RunStats`."""
+        results = self.results()
+        return None if results is None else calc_stats(results, percentiles)
+
+    def __iter__(self):
+        if self._greenlet is None:
+            raise RuntimeError('The load test was not started')
+        while True:
+            item = self._queue.get()
+            if item is StopIteration:
+                # for the next ones iterating
+                self._queue.put(StopIteration)
+                return
+            yield item
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
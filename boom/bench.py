@@ -0,0 +1,256 @@
+"""Benchmarks of boom's own overhead.
+
+``boom-bench`` (or ``python -m boom.bench``) starts zero-work servers in
+the process, a raw socket one answering every request with an empty
+200 and a WSGI one, and runs boom against them for every engine,
+concurrency, keep-alive setting and progress mode asked for. Every case
+reports the maximum RPS boom reached and the CPU time it spent per
+request.
+
+The servers share the process and its CPU with boom, so the CPU per
+request includes their (small and constant) part: the numbers are meant
+to be compared between versions or machines, not read as absolute
+costs. Results are saved as JSON with ``--output``, and ``--compare``
+prints the RPS change of every case against a previous file.
+"""
+from __future__ import absolute_import
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from gevent.pywsgi import WSGIServer
+from gevent.server import StreamServer
+
+from boom import __version__
+from boom.boom import run
+from boom.results import calc_stats
+
+
+SERVERS = ('socket', 'wsgi')
+# the asyncio and http2 engines need a loop or an HTTP/2 server of their
+# own, they are not benchmarked
+ENGINES = ('requests', 'urllib3', 'socket')
+_RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n'
+_CLOSE = b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+
+def _respond(sock, address):
+    """Answers the requests of a connection, which have no body, until
+    the client closes it or asks to."""
+    data = b''
+    while True:
+        while b'\r\n\r\n' not in data:
+            chunk = sock.recv(65536)
+            if not chunk:
+                sock.close()
+                return
+            data += chunk
+        head, data = data.split(b'\r\n\r\n', 1)
+        if b'connection: close' in head.lower():
+            sock.sendall(_CLOSE)
+            sock.close()
+            return
+        sock.sendall(_RESPONSE)
+
+
+def _app(environ, start_response):
+    start_response('200 OK', [('Content-Length', '0')])
+    return [b'']
+
+
+def start_server(kind):
+    """Starts a zero-work server of the *kind* given, one of
+    :data:`SERVERS`, and returns it with its URL."""
+    if kind == 'socket':
+        server = StreamServer(('127.0.0.1', 0), _respond)
+    else:
+        server = WSGIServer(('127.0.0.1', 0), _app, log=None)
+    server.start()
+    return server, 'http://127.0.0.1:%d/' % server.server_port
+
+
+def _cpu():
+    if hasattr(time, 'process_time'):
+        return time.process_time()
+    # Python 2, at the resolution of the clock ticks
+    times = os.times()
+    return times[0] + times[1]
+
+
+class _Terminal(object):
+    """The null device passing for a terminal, so that the progress bar
+    is redrawn at the rate of a terminal."""
+
+    def __init__(self):
+        self._file = open(os.devnull, 'w')
+
+    def isatty(self):
+        return True
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def measure(url, requests, concurrency, engine, keepalive, progress):
+    """Runs *requests* calls to *url* and returns their RPS, CPU time per
+    request and latency."""
+    stdout = sys.stdout
+    if progress:
+        # the bar is drawn, nobody needs to see it
+        sys.stdout = _Terminal()
+    try:
+        cpu = _cpu()
+        res = run(url, requests, concurrency=concurrency, engine=engine,
+                  keepalive=keepalive, quiet=not progress)
+        cpu = _cpu() - cpu
+    finally:
+        if progress:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    stats = calc_stats(res, percentiles=(50, 99))
+    return {'requests': stats.count, 'errors': len(res.errors),
+            'time': res.total_time, 'rps': stats.rps,
+            'cpu_per_request': cpu / max(stats.count, 1),
+            'p50': stats.percentiles['p50'], 'p99': stats.percentiles['p99']}
+
+
+def bench(requests=2000, servers=SERVERS, engines=ENGINES,
+          concurrencies=(1, 10, 50), keepalives=(True, False),
+          progresses=(False, True), callback=None):
+    """Runs every combination of the arguments and returns the results,
+    as a list of dicts. *callback* is called with every one of them once
+    it's done."""
+    cases = []
+    for kind in servers:
+        server, url = start_server(kind)
+        try:
+            # the first calls pay for imports and caches
+            run(url, 10, quiet=True)
+            for engine in engines:
+                for concurrency in concurrencies:
+                    for keepalive in keepalives:
+                        for progress in progresses:
+                            case = {'server': kind, 'engine': engine,
+                                    'concurrency': concurrency,
+                                    'keepalive': keepalive,
+                                    'progress': progress}
+                            case.update(measure(url, requests, concurrency,
+                                                engine, keepalive, progress))
+                            cases.append(case)
+                            if callback is not None:
+                                callback(case)
+        finally:
+            server.stop()
+    return cases
+
+
+def _key(case):
+    return (case['server'], case['engine'], case['concurrency'],
+            case['keepalive'], case['progress'])
+
+
+def print_case(case, previous=None):
+    line = ('%-6s %-8s c=%-4d %-13s %-8s %8d RPS %8.1f us/req '
+            'p50 %.4f s p99 %.4f s' % (
+                case['server'], case['engine'], case['concurrency'],
+                'keep-alive' if case['keepalive'] else 'no keep-alive',
+                'progress' if case['progress'] else 'quiet', case['rps'],
+                case['cpu_per_request'] * 1000000, case['p50'],
+                case['p99']))
+    if case['errors']:
+        line += ' (%d errors)' % case['errors']
+    if previous is not None and previous['rps']:
+        line += ' %+.1f%%' % ((case['rps'] / previous['rps'] - 1) * 100)
+    print(line)
+
+
+def _list(cast):
+    def parse(value):
+        try:
+            return [cast(item) for item in value.split(',')]
+        except ValueError:
+            raise argparse.ArgumentTypeError('must be a comma separated '
+                                             'list')
+    return parse
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks boom's own overhead against zero-work "
+                    "servers.")
+    parser.add_argument('-n', '--requests', type=int, default=2000,
+                        help='Number of requests of every case')
+    parser.add_argument('--servers', type=_list(str), default=SERVERS,
+                        help='Comma separated servers, among %s' %
+                             ', '.join(SERVERS))
+    parser.add_argument('--engines', type=_list(str), default=ENGINES,
+                        help='Comma separated engines, among %s' %
+                             ', '.join(ENGINES))
+    parser.add_argument('--concurrency', type=_list(int),
+                        default=[1, 10, 50],
+                        help='Comma separated concurrency levels')
+    parser.add_argument('--no-keepalive-only', action='store_true',
+                        help='Only benchmark without keep-alive')
+    parser.add_argument('--keepalive-only', action='store_true',
+                        help='Only benchmark with keep-alive')
+    parser.add_argument('--no-progress', action='store_true',
+                        help="Don't benchmark with the progress bar")
+    parser.add_argument('-o', '--output',
+                        help='Save the results to this JSON file')
+    parser.add_argument('--compare',
+                        help='Show the RPS change against the results '
+                             'saved in this JSON file')
+    args = parser.parse_args()
+
+    unknown = (set(args.servers) - set(SERVERS) or
+               set(args.engines) - set(ENGINES))
+    if unknown or args.requests < 1 or \
+            not all(c > 0 for c in args.concurrency) or \
+            (args.keepalive_only and args.no_keepalive_only):
+        print('Invalid servers, engines, number of requests or keep-alive '
+              'options')
+        parser.print_usage()
+        sys.exit(1)
+
+    keepalives = (True, False)
+    if args.keepalive_only:
+        keepalives = (True,)
+    elif args.no_keepalive_only:
+        keepalives = (False,)
+
+    previous = {}
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = dict((_key(case), case)
+                            for case in json.load(f)['results'])
+
+    print('boom %s on Python %s, %s' % (__version__,
+                                        platform.python_version(),
+                                        platform.platform()))
+    cases = bench(args.requests, args.servers, args.engines,
+                  args.concurrency, keepalives,
+                  (False,) if args.no_progress else (False, True),
+                  lambda case: print_case(case, previous.get(_key(case))))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'version': __version__,
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'requests': args.requests,
+                       'results': cases}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 from __future__ import absolute_import
 import argparse
-import gevent
+import json
 import logging
+import math
+import multiprocessing
+import os
+import random
 import requests
+import signal
 import sys
 import time
 
@@ -11,96 +16,140 @@ try:
 except ImportError:
     from urllib import parse as urlparse
 
-import math
-from collections import defaultdict, namedtuple
-from copy import copy
-from gevent import monkey
+from collections import deque, OrderedDict
+from functools import partial
+from itertools import islice, repeat, takewhile
+from gevent import fork, sleep, spawn
+from gevent.fileobject import FileObject
+from gevent.os import waitpid
 from gevent.pool import Pool
 from requests import RequestException
 from requests.packages.urllib3.util import parse_url
 from socket import gethostbyname, gaierror
 
 from boom import __version__
-from boom.util import resolve_name
+from boom.util import patch, resolve_name, monotonic, share
 from boom.pgbar import AnimatedProgressBar
+from boom.distributed import AgentError, coordinate, parse_agents, serve
+from boom.engines import ENGINES, Template, get_engine
+from boom.output import FORMATS, ResultWriter
+from boom.payload import ORDERS, PayloadPool
+from boom.profile import Profile, arrivals
+from boom.replay import AccessLog, timed
+from boom.resolver import Resolver, parse_override
+from boom.scenario import Mix, Scenario
+from boom.sockets import SocketOptions
+from boom.results import (_PERCENTILES, RunResults, RunStats,  # NOQA
+                          calc_stats)
 
 
-monkey.patch_all()
 logger = logging.getLogger('boom')
 _VERBS = ('GET', 'POST', 'DELETE', 'PUT', 'HEAD', 'OPTIONS')
 _DATA_VERBS = ('POST', 'PUT')
-
-
-class RunResults(object):
-
-    """Encapsulates the results of a single Boom run.
-
-    Contains a dictionary of status codes to lists of request durations,
-    a list of exception instances raised during the run, the total time
-    of the run and an animated progress bar.
+_ARRIVALS = ('fixed', 'poisson')
+# the asyncio backend replaces the whole gevent run, see boom.aio
+_ENGINES = sorted(ENGINES) + ['asyncio']
+# seconds given to the calls in flight to finish once a -d run is over
+_DRAIN_TIMEOUT = 5
+# seconds between two updates of the level of a run following a profile
+_PROFILE_TICK = .1
+# seconds between two redraws of the progress bar on a terminal
+_PROGRESS_REFRESH = .1
+
+
+class Progress(object):
+    """Draws the progress of a run, with its live RPS and an ETA.
+
+    Calls only bump the ``done`` counter of the RunResults, :meth:`loop`
+    redraws the bar at a fixed refresh rate, once per second when the
+    output is not a terminal. The bar follows the number of calls, or
+    the time elapsed when the run has a *duration*. Runs without either,
+    like the replay of a log, only show the calls done.
     """
 
-    def __init__(self, num=1, quiet=False):
-        self.status_code_counter = defaultdict(list)
-        self.errors = []
-        self.total_time = None
-        if num is not None:
-            self._progress_bar = AnimatedProgressBar(
-                end=num,
-                width=65)
+    def __init__(self, results, start, duration=None, stdout=None):
+        self.results = results
+        self.start = start
+        self.duration = duration
+        self.stdout = stdout or sys.stdout
+        self.tty = hasattr(self.stdout, 'isatty') and self.stdout.isatty()
+        self.refresh = _PROGRESS_REFRESH if self.tty else 1
+        end = duration if results.num is None else results.num
+        self.bar = AnimatedProgressBar(end=end or 1, width=65)
+        # (time, calls done) over the last second, for the live RPS
+        self.window = deque(maxlen=int(1 / self.refresh) + 1)
+
+    def draw(self):
+        now = monotonic()
+        elapsed = now - self.start
+        done = self.results.done
+        self.window.append((now, done))
+        first_time, first_done = self.window[0]
+
+        if now > first_time:
+            rps = (done - first_done) / (now - first_time)
         else:
-            self._progress_bar = None
-        self.quiet = quiet
+            rps = 0
 
-    def incr(self):
-        if self.quiet:
-            return
-        if self._progress_bar is not None:
-            self._progress_bar + 1
-            self._progress_bar.show_progress()
+        if self.results.num is None and self.duration is None:
+            eta = None
+        elif self.results.num is None:
+            self.bar.reset() + min(elapsed, self.bar.end)
+            eta = self.duration - elapsed
         else:
-            sys.stdout.write('.')
-            sys.stdout.flush()
-
-
-RunStats = namedtuple(
-    'RunStats', ['count', 'total_time', 'rps', 'avg', 'min',
-                 'max', 'amp', 'stdev'])
-
+            self.bar.reset() + done
+            if done:
+                eta = (self.results.num - done) * elapsed / done
+            else:
+                eta = None
 
-def calc_stats(results):
-    """Calculate stats (min, max, avg) from the given RunResults.
+        line = '%s %d calls, %d RPS' % (self.bar, done, rps)
+        if eta is not None:
+            line += ', ETA %ds' % max(0, round(eta))
 
-       The statistics are returned as a RunStats object.
-    """
-    all_res = []
-    count = 0
-    for values in results.status_code_counter.values():
-        all_res += values
-        count += len(values)
+        self.stdout.write('\r' if self.tty else '\n')
+        self.stdout.write(line)
+        self.stdout.flush()
 
-    cum_time = sum(all_res)
+    def loop(self):
+        while True:
+            self.draw()
+            sleep(self.refresh)
 
-    if cum_time == 0 or len(all_res) == 0:
-        rps = avg = min_ = max_ = amp = stdev = 0
-    else:
-        if results.total_time == 0:
-            rps = 0
-        else:
-            rps = len(all_res) / float(results.total_time)
-        avg = sum(all_res) / len(all_res)
-        max_ = max(all_res)
-        min_ = min(all_res)
-        amp = max(all_res) - min(all_res)
-        stdev = math.sqrt(sum((x-avg)**2 for x in all_res) / count)
 
-    return (
-        RunStats(count, results.total_time, rps, avg, min_, max_, amp, stdev)
-    )
+class IntervalReporter(object):
+    """Calls *callback* every *interval* seconds with the RunResults of the
+    calls done during the last interval, and the seconds elapsed since
+    *start*.
 
+    The results of a run point to the ones of the running interval, which
+    get replaced by a new RunResults at the end of each interval.
+    """
 
-def print_stats(results):
-    stats = calc_stats(results)
+    def __init__(self, results, interval, callback, start):
+        self.results = results
+        self.interval = interval
+        self.callback = callback
+        self.start = self.began = start
+        self.results.interval = RunResults(None, quiet=True)
+
+    def rotate(self):
+        """Ends the running interval and reports it."""
+        now = monotonic()
+        done = self.results.interval
+        self.results.interval = RunResults(None, quiet=True)
+        done.total_time = now - self.began
+        self.began = now
+        self.callback(done, now - self.start)
+
+    def loop(self):
+        while True:
+            sleep(max(0, self.began + self.interval - monotonic()))
+            self.rotate()
+
+
+def print_stats(results, percentiles=_PERCENTILES):
+    stats = calc_stats(results, percentiles)
     rps = stats.rps
 
     print('')
@@ -113,6 +162,20 @@ def print_stats(results):
     print('Slowest           \t\t%.4f s  ' % stats.max)
     print('Amplitude         \t\t%.4f s  ' % stats.amp)
     print('Standard deviation\t\t%.6f' % stats.stdev)
+    for label, value in stats.percentiles.items():
+        print('%-18s\t\t%.4f s  ' % (label, value))
+    if stats.dropped:
+        print('Dropped calls     \t\t%d' % stats.dropped)
+    if stats.client_errors:
+        print('Client exhaustion \t\t%d' % stats.client_errors)
+    if stats.schedule_lag is not None:
+        print('Scheduler lag     \t\t%s' % ', '.join(
+            '%s %.4f s' % item for item in stats.schedule_lag.items()))
+    print('New connections   \t\t%d' % stats.new_connections)
+    print('Reused connections\t\t%d' % stats.reused_connections)
+    if stats.streams is not None:
+        print('Streams           \t\t%s' % ', '.join(
+            '%s %d' % item for item in stats.streams.items()))
     print('RPS               \t\t%d' % rps)
     if rps > 500:
         print('BSI              \t\tWoooooo Fast')
@@ -124,19 +187,73 @@ def print_stats(results):
         print('BSI              \t\t:(')
     print('')
     print('-------- Status codes --------')
-    for code, items in results.status_code_counter.items():
-        print('Code %d          \t\t%d times.' % (code, len(items)))
+    for code, items in stats.status_codes.items():
+        print('Code %s          \t\t%d times.' % (code, items['count']))
+        print('\t' + ', '.join('%s %.4f s' % item
+                               for item in items['percentiles'].items()))
+    # the errors of the client itself are not the server's fault
+    for title, client in (('Errors', False), ('Client errors', True)):
+        errors = [error for error in stats.errors
+                  if error['client'] == client]
+        if not errors:
+            continue
+        print('')
+        print('-------- %s --------' % title)
+        for error in errors:
+            if error['type'] is None:
+                print('%8d times\t%s' % (error['count'], error['message']))
+            else:
+                print('%8d times\t%s: %s' % (error['count'], error['type'],
+                                             error['message']))
+    if stats.phases:
+        print('')
+        print('-------- Phases --------')
+        for phase, items in stats.phases.items():
+            print('%-18s\t\t%d times, avg %.4f s, %s' % (
+                phase, items['count'], items['avg'], ', '.join(
+                    '%s %.4f s' % item
+                    for item in items['percentiles'].items())))
+    # a single address says nothing about the balance of the load
+    addresses = stats.addresses if len(stats.addresses) > 1 else []
+    for title, summaries in (('Stages', stats.stages),
+                             ('Endpoints', stats.endpoints),
+                             ('Addresses', addresses)):
+        if not summaries:
+            continue
+        print('')
+        print('-------- %s --------' % title)
+        for summary in summaries:
+            summary_percentiles = ', '.join(
+                '%s %.4f s' % item for item in summary['percentiles'].items())
+            print('%-18s\t\t%d calls, %d errors, %d RPS, avg %.4f s, %s' % (
+                summary['label'], summary['count'], summary['errors'],
+                summary['rps'], summary['avg'], summary_percentiles))
     print('')
     print('-------- Legend --------')
     print('RPS: Request Per Second')
     print('BSI: Boom Speed Index')
-
-
-def print_server_info(url, method, headers=None):
-    res = requests.head(url)
-    print(
-        'Server Software: %s' %
-        res.headers.get('server', 'Unknown'))
+    if stats.phases:
+        print('connect: TCP handshake')
+        print('tls: TLS handshake')
+        print('ttfb: time to first byte, from request sent to headers read')
+        print('body: time to read the response body')
+    if stats.streams is not None:
+        print('Streams: HTTP/2 streams opened and reset by the server, '
+              'waits for a flow control window (stalls) and connections '
+              'closed by a GOAWAY')
+    if stats.client_errors:
+        print('Client exhaustion: calls failed because this machine ran '
+              'out of local ports or file descriptors, not because of the '
+              'server. Keep connections alive, or try --source-addresses '
+              'and --linger 0')
+
+
+def print_server_info(url, method, headers=None, probe=True):
+    if probe:
+        res = requests.head(url)
+        print(
+            'Server Software: %s' %
+            res.headers.get('server', 'Unknown'))
     print('Running %s %s' % (method, url))
 
     if headers:
@@ -153,52 +270,211 @@ def print_errors(errors):
         print(error)
 
 
-def print_json(results):
+def print_json(results, percentiles=_PERCENTILES):
     """Prints a JSON representation of the results to stdout."""
-    import json
-    stats = calc_stats(results)
+    stats = calc_stats(results, percentiles)
     print(json.dumps(stats._asdict()))
 
 
-def onecall(method, url, results, **options):
-    """Performs a single HTTP call and puts the result into the
-       status_code_counter.
+def print_interval(results, elapsed, percentiles=_PERCENTILES,
+                   json_output=False):
+    """Prints the results of an interval of a run, as a line of text or of
+    JSON."""
+    stats = calc_stats(results, percentiles)
+    codes = OrderedDict((code, items['count'])
+                        for code, items in stats.status_codes.items())
+
+    if json_output:
+        print(json.dumps(OrderedDict((
+            ('elapsed', elapsed), ('count', stats.count),
+            ('rps', stats.rps), ('errors', len(results.errors)),
+            ('status_codes', codes), ('percentiles', stats.percentiles)))))
+        return
+
+    print('[%7.1fs] %d calls, %d RPS, %d errors, %s%s' % (
+        elapsed, stats.count, stats.rps, len(results.errors),
+        ''.join('%s: %d, ' % item for item in codes.items()),
+        ', '.join('%s %.4f s' % item for item in stats.percentiles.items())))
 
-    RequestExceptions are caught and put into the errors set.
-    """
-    start = time.time()
 
-    if 'data' in options and callable(options['data']):
-        options = copy(options)
-        options['data'] = options['data'](method, url, options)
+def onecall(template, results, start=None, worker=0):
+    """Performs the call of a :class:`boom.engines.Template` and puts the
+       result into the status_code_counter.
 
-    if 'pre_hook' in options:
-        method, url, options = options[
-            'pre_hook'](method, url, options)
-        del options['pre_hook']
+    RequestExceptions are caught and counted in the errors table, like
+    any other exception of a hook or a data callable, so that a worker
+    goes on with its next calls.
 
-    if 'post_hook' in options:
-        post_hook = options['post_hook']
-        del options['post_hook']
+    When given, *start* is the time at which the call was meant to be
+    sent: the duration is counted from it, and the delay to actually send
+    the call is recorded as the scheduler lag.
+
+    *worker* is the index of the worker making the call, for the output
+    file.
+    """
+    if results.output is not None:
+        timestamp = time.time()
+
+    if start is None:
+        start = monotonic()
     else:
-        def post_hook(res):
-            return res
+        results.schedule_lag.append(max(0., monotonic() - start))
 
     try:
-        res = post_hook(method(url, **options))
-    except RequestException as exc:
-        results.errors.append(exc)
+        if template.dynamic:
+            method, url, options = template.build()
+            res = method(url, **options)
+        else:
+            res = template.engine.send(template.prepared)
+        address = getattr(res, 'address', None)
+        if template.post_hook is not None:
+            res = template.post_hook(res)
+    except Exception as exc:
+        if not isinstance(exc, RequestException):
+            # a bug of a hook or a data callable, counted in the summary,
+            # the tracebacks would flood the output at a high rate
+            logger.debug('Call failed', exc_info=True)
+        results.record_error(exc, template.endpoint,
+                             getattr(exc, 'address', None))
+        if results.output is not None:
+            results.output.write(timestamp, monotonic() - start, 0, 0,
+                                 exc.__class__.__name__, worker)
     else:
-        duration = time.time() - start
-        results.status_code_counter[res.status_code].append(duration)
+        duration = monotonic() - start
+        results.record(res.status_code, duration, template.endpoint,
+                       address)
+        if results.output is not None:
+            results.output.write(timestamp, duration, res.status_code,
+                                 len(res.content or b''), '', worker)
     finally:
         results.incr()
 
 
+def worker(tasks, results, index=0):
+    """Performs the call of every :class:`boom.engines.Template` of
+    *tasks*.
+
+    *tasks* is shared by all the workers of a run, so that *concurrency*
+    long-lived workers can be fed without spawning a greenlet per call.
+    """
+    for template in tasks:
+        onecall(template, results, worker=index)
+
+
+def picks(calls, tasks):
+    """Yields a template picked from *calls* for every item of *tasks*.
+
+    *calls* is a :class:`boom.engines.Template` or a
+    :class:`boom.scenario.Mix` of them.
+    """
+    for _ in tasks:
+        yield calls.pick()
+
+
+def until(deadline):
+    """Yields until the monotonic clock reaches *deadline*."""
+    while monotonic() < deadline:
+        yield
+
+
+def active(index, levels, deadline):
+    """Yields until *deadline* as long as the worker *index* is below the
+    current level, the first item of *levels*."""
+    while index < levels[0] and monotonic() < deadline:
+        yield
+
+
+def follow(profile, start, results, resize=None):
+    """Follows *profile* from *start* until its end.
+
+    Every tick, the results of the stage running are put in
+    ``results.stage`` and *resize* is called with the current level.
+    """
+    while True:
+        elapsed = monotonic() - start
+        results.stage = results.stages[profile.stage(elapsed)]
+        if elapsed >= profile.duration:
+            return
+        if resize is not None:
+            resize(profile.level(elapsed))
+        sleep(_PROFILE_TICK)
+
+
+def dispatch(schedule, pool, results):
+    """Spawns a call for every (time, template) of *schedule*, at that
+    time.
+
+    Calls are sent whatever the calls in flight are doing, so the load
+    doesn't drop when the server slows down. When *pool* is full, calls
+    are late and it shows in the scheduler lag.
+    """
+    for intended, template in schedule:
+        delay = intended - monotonic()
+        if delay > 0:
+            sleep(delay)
+        pool.spawn(onecall, template, results, start=intended)
+
+
+def replayed(requests, engine, url, options, pre_hook=None, post_hook=None):
+    """Yields (timestamp, template) for every request of an access log,
+    their paths being relative to *url*."""
+    for request in requests:
+        yield request.timestamp, Template(
+            engine, request.method, urlparse.urljoin(url, request.path),
+            options, pre_hook, post_hook)
+
+
 def run(
     url, num=1, duration=None, method='GET', data=None, ct='text/plain',
         auth=None, concurrency=1, headers=None, pre_hook=None, post_hook=None,
-        quiet=False):
+        quiet=False, keepalive=True, keep_samples=False, rate=None,
+        arrival='fixed', profile=None, report_interval=None,
+        on_interval=print_interval, output_file=None, output_format='csv',
+        engine='requests', scenario=None, replay=None, replay_speed=None,
+        resolver=None, engine_options=None):
+    """Sends the load and returns its RunResults.
+
+    *num* calls are sent or, when *num* is None, calls are sent for
+    *duration* seconds. When *rate* is given, calls are sent at that rate
+    with at most *concurrency* of them in flight.
+
+    *profile* is a :class:`Profile` making the load change over time.
+    Its levels are rates when *rate* is given, concurrencies otherwise,
+    and it sets the duration of the run.
+
+    Every *report_interval* seconds, *on_interval* is called with the
+    RunResults of the last interval and the seconds elapsed. The progress
+    bar is not shown then.
+
+    *data* is the body of the calls: a string, a ``py:`` path to a
+    callable returning one for every call, or such a callable, like a
+    :class:`boom.payload.PayloadPool`.
+
+    When *output_file* is given, every call is written to it in the
+    *output_format* format, see :mod:`boom.output`.
+
+    *engine* is the name of the HTTP client sending the calls, see
+    :mod:`boom.engines`. With a :class:`boom.resolver.Resolver` as
+    *resolver*, its connections go to all the addresses of the hosts in
+    turn and the results are also given by address. *engine_options* are
+    the extra arguments of the engine, like the ``connections`` and
+    ``streams`` of the http2 one.
+
+    When *scenario* is given, every call is picked from the requests of
+    this :class:`boom.scenario.Scenario` instead of being a *method* call
+    to *url*. *headers*, *auth* and the hooks apply to all of them.
+
+    When *replay* is given, the requests of this :class:`boom.replay.
+    AccessLog` (or any iterable of :class:`boom.replay.Request`) are sent
+    to *url* until the log, *num* or *duration* is over. They are sent at
+    their time in the log divided by *replay_speed*, the drift from the
+    log being the scheduler lag, or as fast as possible by *concurrency*
+    workers when *replay_speed* is None.
+
+    The standard library is monkey patched for gevent first, see
+    :func:`boom.util.patch`.
+    """
+    patch()
 
     if headers is None:
         headers = {}
@@ -206,18 +482,28 @@ def run(
     if 'content-type' not in headers:
         headers['Content-Type'] = ct
 
-    if data is not None and data.startswith('py:'):
+    if isinstance(data, str) and data.startswith('py:'):
         callable = data[len('py:'):]
         data = resolve_name(callable)
 
-    method = getattr(requests, method.lower())
+    if profile is not None:
+        num, duration = None, profile.duration
+        if not rate:
+            concurrency = int(math.ceil(profile.peak))
+
+    res = RunResults(num, quiet, keep_samples)
+    if output_file is not None:
+        res.output = ResultWriter(output_file, output_format)
+        res.output.start()
+    engine = get_engine(engine, res, concurrency, keepalive, resolver,
+                        **(engine_options or {}))
     options = {'headers': headers}
 
     if pre_hook is not None:
-        options['pre_hook'] = resolve_name(pre_hook)
+        pre_hook = resolve_name(pre_hook)
 
     if post_hook is not None:
-        options['post_hook'] = resolve_name(post_hook)
+        post_hook = resolve_name(post_hook)
 
     if data is not None:
         options['data'] = data
@@ -225,34 +511,249 @@ def run(
     if auth is not None:
         options['auth'] = tuple(auth.split(':', 1))
 
+    if scenario is None:
+        calls = Template(engine, method.upper(), url, options, pre_hook,
+                         post_hook)
+    else:
+        templates = []
+        for index, entry in enumerate(scenario.entries):
+            entry_options = dict(options, headers=dict(headers,
+                                                       **entry.headers))
+            if entry.data is not None:
+                entry_options['data'] = entry.data
+                if entry.data.startswith('py:'):
+                    entry_options['data'] = resolve_name(entry.data[3:])
+            templates.append(Template(engine, entry.method, entry.url,
+                                      entry_options, pre_hook, post_hook,
+                                      endpoint=index))
+            res.endpoints.append(RunResults(None, quiet=True,
+                                            label=entry.name))
+        calls = Mix(templates, [entry.weight for entry in scenario.entries])
+
     pool = Pool(concurrency)
-    start = time.time()
-    jobs = None
-    res = RunResults(num, quiet)
+    start = monotonic()
+    deadline = (start + duration
+                if num is None and duration is not None else None)
+    follower = reporter = intervals = None
+
+    if report_interval is not None:
+        intervals = IntervalReporter(res, report_interval, on_interval, start)
+        reporter = spawn(intervals.loop)
+    elif not quiet:
+        progress = Progress(res, start, duration)
+        reporter = spawn(progress.loop)
+
+    if profile is not None:
+        res.stages = [RunResults(None, quiet=True, label=label)
+                      for label in profile.labels]
+        for stage, stage_res in zip(profile.stages, res.stages):
+            stage_res.total_time = stage.duration
+        res.stage = res.stages[0]
 
     try:
-        if num is not None:
-            jobs = [pool.spawn(onecall, method, url, res, **options)
-                    for i in range(num)]
+        if replay is not None:
+            if num is not None:
+                replay = islice(replay, num)
+            tasks = replayed(replay, engine, url, options, pre_hook,
+                             post_hook)
+            if replay_speed is not None:
+                tasks = timed(tasks, start, replay_speed)
+                if deadline is not None:
+                    tasks = takewhile(lambda item: item[0] < deadline, tasks)
+                dispatch(tasks, pool, res)
+            else:
+                tasks = (template for __, template in tasks)
+                if deadline is not None:
+                    tasks = takewhile(lambda item: monotonic() < deadline,
+                                      tasks)
+                for i in range(concurrency):
+                    pool.spawn(worker, tasks, res, i)
+        elif rate is not None:
+            if profile is not None:
+                follower = spawn(follow, profile, start, res)
+                rate = profile
+            tasks = arrivals(rate, start, arrival == 'poisson')
+            if deadline is None:
+                tasks = islice(tasks, num)
+            else:
+                tasks = takewhile(lambda intended: intended < deadline, tasks)
+            dispatch(((intended, calls.pick()) for intended in tasks), pool,
+                     res)
+        elif profile is not None:
+            workers = {}
+
+            def resize(level):
+                # workers beyond the level stop after their current call,
+                # the missing ones are (re)started.
+                level = int(round(level))
+                for index in range(level):
+                    if index not in workers or workers[index].dead:
+                        tasks = picks(calls, active(index, levels, deadline))
+                        workers[index] = pool.spawn(worker, tasks, res,
+                                                    index)
+                levels[0] = level
+
+            levels = [0]
+            follow(profile, start, res, resize)
+        elif deadline is None:
+            tasks = picks(calls, repeat(None, num))
+            for i in range(min(concurrency, num)):
+                pool.spawn(worker, tasks, res, i)
+        else:
+            # every worker stops picking new calls at the deadline
+            for i in range(concurrency):
+                pool.spawn(worker, picks(calls, until(deadline)), res, i)
+
+        if deadline is None:
             pool.join()
         else:
-            with gevent.Timeout(duration, False):
-                jobs = []
-                while True:
-                    jobs.append(pool.spawn(onecall, method, url, res,
-                                           **options))
-                pool.join()
+            # the calls in flight get a chance to finish and be counted.
+            pool.join(timeout=max(0, deadline - monotonic()) +
+                      _DRAIN_TIMEOUT)
+            if len(pool):
+                res.dropped = len(pool)
+                pool.kill()
     except KeyboardInterrupt:
         # In case of a keyboard interrupt, just return whatever already got
         # put into the result object.
-        pass
+        pool.kill()
+    finally:
+        res.total_time = monotonic() - start
+        for part in res.endpoints + list(res.addresses.values()):
+            part.total_time = res.total_time
+        if follower is not None:
+            follower.kill()
+        if reporter is not None:
+            reporter.kill()
+            if intervals is not None:
+                intervals.rotate()
+                res.interval = None
+            else:
+                progress.draw()
+        if res.output is not None:
+            res.output.close()
+            res.output = None
+        engine.close()
+
+    return res
+
+
+class ProcessError(Exception):
+    """A process of a run failed."""
+
+
+def run_processes(processes, url, num=1, duration=None, concurrency=1,
+                  output_file=None, **options):
+    """Runs :func:`run` in *processes* forked processes.
+
+    The requests and the concurrency are split across the processes, and
+    their results are merged in a single RunResults. Every process sends
+    back the summary given by :meth:`RunResults.to_dict` through a pipe.
+    With an *output_file*, every process writes its calls to its own
+    file, suffixed with the index of the process. Other *options* are
+    passed to :func:`run` as-is, but for the interval reports which
+    are not supported.
+
+    Raises a :class:`ProcessError` when a process fails.
+    """
+    if not hasattr(os, 'fork'):
+        raise NotImplementedError('Multiple processes need os.fork()')
+    if options.get('report_interval') is not None:
+        raise ValueError('The intervals of several processes are not '
+                         'merged')
+
+    patch()
+    processes = max(1, min(processes, concurrency,
+                           num if num is not None else concurrency))
+    options['quiet'] = True
+    profile = options.get('profile')
+    if options.get('rate') is not None:
+        options['rate'] /= float(processes)
+        if profile is not None:
+            options['profile'] = profile.scaled(1. / processes)
+    children = []
+
+    for index in range(processes):
+        calls = share(num, processes, index) if num is not None else None
+        read_fd, write_fd = os.pipe()
+        pid = fork()
+
+        if pid == 0:
+            os.close(read_fd)
+            # the random payloads, arrivals and scenario calls differ from
+            # the ones of the other processes
+            random.seed('%d-%d' % (os.getpid(), index))
+            try:
+                try:
+                    if output_file is not None:
+                        options['output_file'] = '%s.%d' % (output_file,
+                                                            index)
+                    if options.get('resolver') is not None:
+                        # the processes start with different addresses
+                        options['resolver'].offset = index
+                    if profile is not None and options.get('rate') is None:
+                        # every process runs a whole number of workers
+                        options['profile'] = profile.shared(processes,
+                                                            index)
+                    res = run(url, calls, duration,
+                              concurrency=share(concurrency, processes,
+                                                index),
+                              **options)
+                    message = {'results': res.to_dict()}
+                except Exception as e:
+                    message = {'error': '%s: %s' % (e.__class__.__name__,
+                                                    e)}
+                with os.fdopen(write_fd, 'w') as pipe:
+                    pipe.write(json.dumps(message))
+            finally:
+                os._exit(0)
+
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    res = RunResults(None, quiet=True)
+    res.total_time = 0
+    # on an interrupt the children stop and send back what they did so
+    # far, the parent waits for them.
+    handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    errors = []
+
+    try:
+        for index, (pid, read_fd) in enumerate(children):
+            # a cooperative read, so that the hub keeps running
+            pipe = FileObject(read_fd, 'r')
+            try:
+                data = pipe.read()
+            finally:
+                pipe.close()
+            status = waitpid(pid, 0)[1]
+
+            if not data:
+                errors.append('process %d exited with status %d' % (
+                    index, status))
+                continue
+            message = json.loads(data)
+            if 'error' in message:
+                errors.append('process %d failed: %s' % (
+                    index, message['error']))
+            else:
+                res.merge(RunResults.from_dict(message['results']))
     finally:
-        res.total_time = time.time() - start
+        signal.signal(signal.SIGINT, handler)
 
+    if errors:
+        raise ProcessError('The run failed, %s' % ', '.join(errors))
     return res
 
 
 def resolve(url):
+    """Returns the *url* with its host replaced by its first IPv4 address
+    for plain HTTP, its host and port, and its resolved host and port.
+
+    Runs no longer use it, their connections are spread over all the
+    addresses of a host by a :class:`boom.resolver.Resolver`.
+    """
     parts = parse_url(url)
 
     if not parts.port and parts.scheme == 'https':
@@ -281,28 +782,157 @@ def resolve(url):
 
 
 def load(url, requests, concurrency, duration, method, data, ct, auth,
-         headers=None, pre_hook=None, post_hook=None, quiet=False):
+         headers=None, pre_hook=None, post_hook=None, quiet=False,
+         keepalive=True, processes=1, rate=None, arrival='fixed',
+         profile=None, report_interval=None, on_interval=print_interval,
+         output_file=None, output_format='csv', engine='requests',
+         scenario=None, replay=None, replay_speed=None, resolver=None,
+         engine_options=None, agents=None):
     if not quiet:
-        print_server_info(url, method, headers=headers)
-
-        if requests is not None:
+        if replay is not None:
+            print('Replaying %s on %s %s' % (
+                replay.path, url, 'as fast as possible'
+                if replay_speed is None else 'at %gx speed' % replay_speed))
+        elif scenario is None:
+            # the server is probed with an HTTP/1.1 HEAD
+            print_server_info(url, method, headers=headers,
+                              probe=engine != 'http2')
+        else:
+            print('Running a scenario of %d requests: %s' % (
+                len(scenario),
+                ', '.join(entry.name for entry in scenario.entries)))
+
+        if isinstance(data, PayloadPool):
+            print('Sending %d payloads of %d bytes in total, %s' % (
+                len(data), data.size, data.order))
+
+        if profile is not None:
+            print('Following the %s profile %s for %g seconds' % (
+                'rate' if rate is not None else 'concurrency', profile,
+                profile.duration))
+        elif requests is not None:
             print('Running %d queries - concurrency %d' % (requests,
                                                            concurrency))
-        else:
+        elif duration is not None:
             print('Running for %d seconds - concurrency %d.' %
                   (duration, concurrency))
 
+        if rate is not None:
+            print('Sending %g requests per second (%s arrivals)' %
+                  (rate, arrival))
+
+        if processes > 1:
+            print('Using %d processes' % processes)
+
+        if agents is not None:
+            print('Using %d agents: %s' % (len(agents), ', '.join(
+                '%s:%d' % agent for agent in agents)))
+
         sys.stdout.write('Starting the load')
+        if report_interval is not None:
+            print('')
     try:
+        if agents is not None:
+            return coordinate(
+                agents, url, requests, duration, concurrency, method=method,
+                data=data, ct=ct, auth=auth, headers=headers,
+                pre_hook=pre_hook, post_hook=post_hook, keepalive=keepalive,
+                processes=processes, rate=rate, arrival=arrival,
+                profile=profile, engine=engine, scenario=scenario,
+                resolver=resolver, engine_options=engine_options)
+
+        if engine == 'asyncio':
+            from boom import aio
+            return aio.run(url, requests, duration, method, data, ct, auth,
+                           concurrency, headers, pre_hook, post_hook,
+                           keepalive=keepalive, rate=rate, arrival=arrival,
+                           resolver=resolver)
+
+        if processes > 1:
+            return run_processes(
+                processes, url, requests, duration, concurrency,
+                method=method, data=data, ct=ct, auth=auth, headers=headers,
+                pre_hook=pre_hook, post_hook=post_hook, keepalive=keepalive,
+                rate=rate, arrival=arrival, profile=profile,
+                output_file=output_file, output_format=output_format,
+                engine=engine, scenario=scenario, resolver=resolver,
+                engine_options=engine_options)
+
         return run(url, requests, duration, method,
                    data, ct, auth, concurrency, headers,
-                   pre_hook, post_hook, quiet=quiet)
+                   pre_hook, post_hook, quiet=quiet, keepalive=keepalive,
+                   rate=rate, arrival=arrival, profile=profile,
+                   report_interval=report_interval, on_interval=on_interval,
+                   output_file=output_file, output_format=output_format,
+                   engine=engine, scenario=scenario, replay=replay,
+                   replay_speed=replay_speed, resolver=resolver,
+                   engine_options=engine_options)
     finally:
         if not quiet:
             print(' Done')
 
 
+def _processes(value):
+    if value == 'auto':
+        return multiprocessing.cpu_count()
+    try:
+        value = int(value)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            "must be a positive integer or 'auto'")
+    return value
+
+
+def _speed(value):
+    if value == 'max':
+        return None
+    try:
+        value = float(value)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        raise argparse.ArgumentTypeError(
+            "must be a positive number or 'max'")
+    return value
+
+
+def _override(value):
+    try:
+        return parse_override(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _agent(value):
+    host, _, port = value.rpartition(':')
+    try:
+        return host.strip('[]') or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('must be of the form [HOST:]PORT')
+
+
+def _writable(path):
+    """Tells if the file at *path* can be written, or created."""
+    if os.path.isdir(path):
+        return False
+    if os.path.exists(path):
+        return os.access(path, os.W_OK)
+    directory = os.path.dirname(os.path.abspath(path))
+    return os.path.isdir(directory) and os.access(directory, os.W_OK)
+
+
+def _agents(value):
+    try:
+        return parse_agents(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def main():
+    # the gevent code paths patch when they start, the asyncio backend
+    # runs on an unpatched standard library
     parser = argparse.ArgumentParser(
         description='Simple HTTP Load runner.')
 
@@ -321,6 +951,23 @@ def main():
                               'a python callable.'),
                         type=str)
 
+    parser.add_argument('--data-file',
+                        help=('File sent as the body of every call, '
+                              'memory-mapped. Can be repeated to send '
+                              'several files in turn'),
+                        type=str, action='append')
+
+    parser.add_argument('--data-dir',
+                        help=('Directory whose files are sent in turn as '
+                              'the bodies of the calls, memory-mapped'),
+                        type=str)
+
+    parser.add_argument('--data-order',
+                        help=('Order in which the --data-file and '
+                              '--data-dir files are sent '
+                              '(default: %(default)s)'),
+                        type=str, default='round-robin', choices=ORDERS)
+
     parser.add_argument('-c', '--concurrency', help='Concurrency',
                         type=int, default=1)
 
@@ -349,11 +996,146 @@ def main():
                               "failed request."),
                         type=str)
 
+    parser.add_argument('--scenario',
+                        help=('JSON (or YAML) file listing the requests to '
+                              'send, with their weights. Their URLs are '
+                              'relative to the url argument if given'),
+                        type=str)
+
+    parser.add_argument('--replay',
+                        help=('Access log (common or combined format) to '
+                              'replay on the url, until its end or the '
+                              '-n/-d limit'),
+                        type=str)
+
+    parser.add_argument('--replay-speed',
+                        help=("Factor applied to the pace of the log, or "
+                              "'max' to replay it as fast as the "
+                              "concurrency allows. The drift from the log "
+                              "is reported as the scheduler lag "
+                              "(default: %(default)s)"),
+                        type=_speed, default=1.)
+
+    parser.add_argument('--resolve',
+                        help=('Sends the calls to host:port to these '
+                              'addresses instead of the resolved ones, as '
+                              'host:port:addr[,addr]... Can be repeated'),
+                        type=_override, action='append')
+
+    parser.add_argument('--rate',
+                        help=('Requests per second to send whatever the '
+                              'server response times, the concurrency is '
+                              'then the maximum number of calls in flight'),
+                        type=float)
+
+    parser.add_argument('--arrival',
+                        help='How requests are spread in a --rate run',
+                        type=str, default='fixed', choices=_ARRIVALS)
+
+    parser.add_argument('--ramp',
+                        help=('Seconds to grow the concurrency (or the '
+                              'rate) from 0 at the start of a -d run'),
+                        type=float)
+
+    parser.add_argument('--profile',
+                        help=('Load profile, eg. 0-100:60,100:120,200:30 '
+                              'ramps from 0 to 100 in 60 seconds, holds '
+                              'for 120 seconds then steps to 200 for 30 '
+                              'seconds. Levels are concurrencies, or rates '
+                              'when --rate is given.'),
+                        type=str)
+
+    parser.add_argument('--processes', '--workers',
+                        help=("Number of processes sending the load, or "
+                              "'auto' for one per CPU"),
+                        type=_processes, default=1, dest='processes')
+
+    parser.add_argument('--engine',
+                        help=('HTTP client sending the calls. urllib3 and '
+                              'socket use less CPU per call than requests '
+                              'but only know plain HTTP calls, hooks get '
+                              'lighter responses. asyncio runs the load in '
+                              'an asyncio event loop instead of gevent, '
+                              'with the same client as socket. http2 '
+                              'multiplexes the calls as HTTP/2 streams, '
+                              'it needs the h2 library '
+                              '(default: %(default)s)'),
+                        type=str, default='requests', choices=_ENGINES)
+
+    parser.add_argument('--http2-connections',
+                        help=('Connections opened per host by the http2 '
+                              'engine (default: %(default)s)'),
+                        type=int, default=1)
+
+    parser.add_argument('--http2-streams',
+                        help=('Streams in flight on every connection of '
+                              'the http2 engine, at most '
+                              '(default: %(default)s)'),
+                        type=int, default=100)
+
+    parser.add_argument('--no-keepalive',
+                        help="Don't reuse connections between requests",
+                        action='store_true')
+
+    parser.add_argument('--source-addresses',
+                        help='Bind the connections to these comma separated '
+                             'local addresses in turn, each has its own '
+                             'ports',
+                        type=lambda value: value.split(','))
+
+    parser.add_argument('--reuseaddr',
+                        help='Set SO_REUSEADDR on the sockets',
+                        action='store_true')
+
+    parser.add_argument('--linger',
+                        help='Set SO_LINGER to this many seconds on the '
+                             'sockets, 0 resets connections on close '
+                             'instead of keeping them in TIME_WAIT',
+                        type=int)
+
+    parser.add_argument('--no-nodelay',
+                        help="Don't set TCP_NODELAY on the sockets",
+                        action='store_true')
+
+    parser.add_argument('--percentiles',
+                        help='Comma-separated list of latency percentiles '
+                             'to report (default: %(default)s)',
+                        type=str,
+                        default=','.join('%g' % p for p in _PERCENTILES))
+
     parser.add_argument('--json-output',
                         help='Prints the results in JSON instead of the '
                              'default format',
                         action='store_true')
 
+    parser.add_argument('--report-interval',
+                        help=('Seconds between two reports of the calls '
+                              'done during the last interval, printed as '
+                              'JSON lines with --json-output'),
+                        type=float)
+
+    parser.add_argument('--output-file',
+                        help=('Streams the result of every call to this '
+                              'file. With --processes, every process '
+                              'writes to its own file suffixed by .INDEX'),
+                        type=str)
+
+    parser.add_argument('--output-format',
+                        help='Format of --output-file',
+                        type=str, default='csv', choices=FORMATS)
+
+    parser.add_argument('--agent',
+                        help='Wait for the runs of coordinators on this '
+                             '[HOST:]PORT instead of running one. HOST is '
+                             '127.0.0.1 by default, 0.0.0.0 listens on '
+                             'every interface',
+                        type=_agent)
+
+    parser.add_argument('--coordinate',
+                        help='Run on these agents, given as '
+                             'HOST[:PORT],..., and merge their results',
+                        type=_agents, metavar='AGENTS')
+
     parser.add_argument('-q', '--quiet', help="Don't display progress bar",
                         action='store_true')
 
@@ -372,25 +1154,185 @@ def main():
         print(__version__)
         sys.exit(0)
 
-    if args.url is None:
+    if args.agent is not None:
+        print('Waiting for runs on %s:%d' % args.agent)
+        serve(*args.agent)
+        sys.exit(0)
+
+    if args.url is None and args.scenario is None:
         print('You need to provide an URL.')
         parser.print_usage()
         sys.exit(0)
 
+    scenario = None
+
+    if args.scenario is not None:
+        try:
+            scenario = Scenario.load(args.scenario, args.url)
+        except (IOError, ValueError) as e:
+            print('Invalid scenario %s: %s' % (args.scenario, e))
+            parser.print_usage()
+            sys.exit(0)
+
     if args.data is not None and args.method not in _DATA_VERBS:
         print("You can't provide data with %r" % args.method)
         parser.print_usage()
         sys.exit(0)
 
-    if args.requests is None and args.duration is None:
+    data = args.data
+
+    if args.data_file is not None or args.data_dir is not None:
+        if args.data is not None or args.method not in _DATA_VERBS or \
+                (args.data_file is not None and args.data_dir is not None):
+            print('--data-file and --data-dir need a POST or PUT method, '
+                  'and no --data nor each other')
+            parser.print_usage()
+            sys.exit(0)
+        try:
+            if args.data_dir is not None:
+                data = PayloadPool.from_dir(args.data_dir, args.data_order)
+            else:
+                data = PayloadPool(args.data_file, args.data_order)
+        except (EnvironmentError, ValueError) as e:
+            print('Invalid payloads: %s' % e)
+            parser.print_usage()
+            sys.exit(0)
+
+    profile = None
+
+    if args.profile is not None or args.ramp is not None:
+        try:
+            if args.profile is not None:
+                if args.requests is not None or args.duration is not None:
+                    raise ValueError('A profile sets the duration itself')
+                profile = Profile.parse(args.profile)
+            else:
+                if args.duration is None:
+                    raise ValueError('--ramp needs a duration')
+                level = args.rate or args.concurrency
+                profile = Profile.ramp(level, args.ramp, args.duration)
+        except ValueError as e:
+            print(str(e))
+            parser.print_usage()
+            sys.exit(0)
+
+        args.duration = profile.duration
+        if args.rate is None:
+            args.concurrency = int(math.ceil(profile.peak))
+
+    replay = None
+
+    if args.replay is not None:
+        if args.url is None or args.scenario is not None or \
+                args.rate is not None or profile is not None or \
+                args.processes > 1 or args.engine == 'asyncio':
+            print('--replay needs an url, and no --scenario, --rate, '
+                  '--ramp, --profile, --processes or asyncio engine')
+            parser.print_usage()
+            sys.exit(0)
+        replay = AccessLog(args.replay)
+        try:
+            replay.check()
+        except (EnvironmentError, ValueError) as e:
+            print('Invalid log %s: %s' % (args.replay, e))
+            parser.print_usage()
+            sys.exit(0)
+    elif args.requests is None and args.duration is None:
         args.requests = 1
 
+    if args.rate is not None and args.rate <= 0:
+        print('The rate must be positive')
+        parser.print_usage()
+        sys.exit(0)
+
+    if args.engine == 'asyncio' and (
+            profile is not None or args.processes > 1 or
+            scenario is not None or
+            args.report_interval is not None or
+            args.output_file is not None):
+        print('The asyncio engine does not support --ramp, --profile, '
+              '--processes, --scenario, --report-interval and '
+              '--output-file')
+        parser.print_usage()
+        sys.exit(0)
+
+    engine_options = None
+
+    if args.engine == 'http2':
+        from boom.http2 import H2Connection
+        if H2Connection is None:
+            print('The http2 engine needs the h2 library')
+            parser.print_usage()
+            sys.exit(0)
+        if args.no_keepalive or args.http2_connections < 1 or \
+                args.http2_streams < 1:
+            print('The http2 engine needs --http2-connections and '
+                  '--http2-streams to be positive, and no --no-keepalive')
+            parser.print_usage()
+            sys.exit(0)
+        engine_options = {'connections': args.http2_connections,
+                          'streams': args.http2_streams}
+
+    if args.coordinate is not None and (
+            isinstance(data, PayloadPool) or replay is not None or
+            args.report_interval is not None or
+            args.output_file is not None):
+        print('--coordinate does not support --data-file, --data-dir, '
+              '--replay, --report-interval and --output-file')
+        parser.print_usage()
+        sys.exit(0)
+
+    if args.source_addresses is not None or args.reuseaddr or \
+            args.linger is not None or args.no_nodelay:
+        sockets = {'source_addresses': args.source_addresses,
+                   'reuseaddr': args.reuseaddr, 'linger': args.linger,
+                   'nodelay': not args.no_nodelay}
+        try:
+            if args.engine == 'asyncio':
+                raise ValueError('The asyncio engine does not support '
+                                 'socket options')
+            if args.linger is not None and args.linger < 0:
+                raise ValueError('--linger must not be negative')
+            SocketOptions(**sockets).check()
+        except (ValueError, EnvironmentError) as e:
+            print('Invalid socket options: %s' % e)
+            parser.print_usage()
+            sys.exit(0)
+        engine_options = dict(engine_options or {}, sockets=sockets)
+
+    if args.report_interval is not None and args.report_interval <= 0:
+        print('The report interval must be positive')
+        parser.print_usage()
+        sys.exit(0)
+
+    if args.report_interval is not None and args.processes > 1:
+        print('--report-interval does not support --processes')
+        parser.print_usage()
+        sys.exit(0)
+
     try:
-        url, original, resolved = resolve(args.url)
-    except gaierror as e:
-        print_errors(("DNS resolution failed for %s (%s)" %
-                      (args.url, str(e)),))
-        sys.exit(1)
+        percentiles = [float(p) for p in args.percentiles.split(',')]
+    except ValueError:
+        percentiles = None
+
+    if not percentiles or not all(0 < p <= 100 for p in percentiles):
+        print('Percentiles must be numbers between 0 and 100')
+        parser.print_usage()
+        sys.exit(0)
+
+    resolver = Resolver(args.resolve)
+
+    if scenario is None:
+        # the requests of a scenario may go to several hosts, their names
+        # are resolved when connecting.
+        parts = parse_url(args.url)
+        try:
+            resolver.addresses(parts.host, parts.port or (
+                443 if parts.scheme == 'https' else 80))
+        except gaierror as e:
+            print_errors(("DNS resolution failed for %s (%s)" %
+                          (args.url, str(e)),))
+            sys.exit(1)
 
     def _split(header):
         header = header.split(':')
@@ -407,24 +1349,45 @@ def main():
     else:
         headers = dict([_split(header) for header in args.header])
 
-    if original != resolved and 'Host' not in headers:
-        headers['Host'] = original
+    if args.output_file is not None:
+        # the processes of a run write to suffixed files
+        if args.processes > 1:
+            paths = ['%s.%d' % (args.output_file, index)
+                     for index in range(args.processes)]
+        else:
+            paths = [args.output_file]
+        for path in paths:
+            if not _writable(path):
+                print('Can not write the output file %s' % path)
+                parser.print_usage()
+                sys.exit(0)
 
     try:
         res = load(
-            url, args.requests, args.concurrency, args.duration,
-            args.method, args.data, args.content_type, args.auth,
+            args.url, args.requests, args.concurrency, args.duration,
+            args.method, data, args.content_type, args.auth,
             headers=headers, pre_hook=args.pre_hook,
-            post_hook=args.post_hook, quiet=(args.json_output or args.quiet))
-    except RequestException as e:
+            post_hook=args.post_hook, quiet=(args.json_output or args.quiet),
+            keepalive=not args.no_keepalive, processes=args.processes,
+            rate=args.rate, arrival=args.arrival, profile=profile,
+            report_interval=args.report_interval,
+            output_file=args.output_file, output_format=args.output_format,
+            engine=args.engine, scenario=scenario, replay=replay,
+            replay_speed=args.replay_speed, resolver=resolver,
+            engine_options=engine_options, agents=args.coordinate,
+            on_interval=partial(print_interval, percentiles=percentiles,
+                                json_output=args.json_output))
+    except (RequestException, AgentError, ProcessError) as e:
         print_errors((e, ))
         sys.exit(1)
 
     if not args.json_output:
-        print_errors(res.errors)
-        print_stats(res)
+        if replay is not None and replay.skipped:
+            print('%d lines of %s could not be parsed' % (replay.skipped,
+                                                          args.replay))
+        print_stats(res, percentiles)
     else:
-        print_json(res)
+        print_json(res, percentiles)
 
     logger.info('Bye!')
 
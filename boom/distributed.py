@@ -0,0 +1,305 @@
+"""Distributed runs, sending the load from several machines.
+
+``boom --agent [HOST:]PORT`` waits for runs on a TCP port, of the
+loopback interface unless a HOST is given, and
+``boom --coordinate HOST:PORT,...`` pushes a run to these agents, starts
+them together and prints their merged results. The calls, the
+concurrency and the rate are split between the agents like between the
+processes of a ``--processes`` run.
+
+Coordinator and agents talk in lines of JSON over one connection per
+run:
+
+- the coordinator sends ``{"run": {...}}``, the arguments of
+  :func:`boom.boom.load` for this agent,
+- the agent checks them and answers ``{"ready": true}``,
+- the coordinator sends ``{"start": TIMESTAMP}``, the same wall clock
+  time to every agent, so clocks should be synchronized (NTP),
+- the agent runs at that time, sends ``{"running": true}`` every few
+  seconds, and sends back ``{"results": {...}}``, the summary of
+  :meth:`boom.results.RunResults.to_dict`, histograms rather than
+  samples.
+
+Both sides give up on a peer silent for too long, and the coordinator
+on an agent still running well after the duration of the run.
+
+Any failure is answered with ``{"error": MESSAGE}``. An agent only
+takes the options of a load, and no file to write, but it runs the loads
+of anyone who can connect to it, hooks included, so it should only
+listen on a trusted network.
+"""
+import json
+import socket
+import time
+
+from gevent import sleep, spawn
+from gevent.lock import Semaphore
+from gevent.server import StreamServer
+
+from boom.profile import Profile, Stage
+from boom.resolver import Resolver
+from boom.results import RunResults
+from boom.scenario import _TEXT, Scenario
+from boom.util import patch, share
+
+
+DEFAULT_PORT = 8888
+# the arguments of boom.boom.load an agent accepts, output files,
+# intervals and payload pools stay with the coordinator
+_RUN_OPTIONS = frozenset([
+    'url', 'requests', 'duration', 'concurrency', 'method', 'data', 'ct',
+    'auth', 'headers', 'pre_hook', 'post_hook', 'keepalive', 'processes',
+    'rate', 'arrival', 'profile', 'engine', 'scenario', 'resolver',
+    'engine_options'])
+# seconds to connect, and to wait for the messages before the run
+_TIMEOUT = 10.
+# seconds between two running messages of an agent, the coordinator
+# gives up after three missing ones
+_HEARTBEAT = 5.
+# seconds given to an agent to send its results after the end of a run of
+# a given duration, for the calls in flight to finish
+_RESULTS_MARGIN = 30.
+# seconds between the start message and the start of the agents, for
+# the message to reach all of them
+_START_DELAY = 1.
+
+
+class AgentError(Exception):
+    """An agent could not be reached, or refused or failed a run."""
+
+
+def parse_agents(value):
+    """Returns the (host, port) of the agents of a ``host[:port],...``
+    list."""
+    agents = []
+    for item in value.split(','):
+        host, _, port = item.strip().rpartition(':')
+        if not host:
+            host, port = port, DEFAULT_PORT
+        try:
+            port = int(port)
+        except ValueError:
+            raise ValueError('%r is not of the form host[:port]' % item)
+        agents.append((host.strip('[]'), port))
+    return agents
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+
+def _receive(reader, key, deadline=None):
+    """Returns the *key* of the next message, raises an AgentError with
+    the error sent instead.
+
+    Running messages are skipped until the *deadline*, a timestamp.
+    """
+    while True:
+        try:
+            line = reader.readline()
+        except socket.timeout:
+            raise AgentError('Timed out')
+        if not line:
+            raise AgentError('Connection closed')
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except ValueError:
+            raise AgentError('Invalid message %r' % line)
+        if 'running' not in message:
+            break
+        if deadline is not None and time.time() > deadline:
+            raise AgentError('Still running after the end of the run')
+    if 'error' in message:
+        raise AgentError(message['error'])
+    if key not in message:
+        raise AgentError('Expected a %r message' % key)
+    return message[key]
+
+
+def dump_options(options):
+    """Returns the *options* of a run as JSON serializable values."""
+    options = dict(options)
+    if options.get('profile') is not None:
+        options['profile'] = {'stages': [list(stage) for stage
+                                         in options['profile'].stages],
+                              'labels': options['profile'].labels}
+    if options.get('scenario') is not None:
+        options['scenario'] = [dict(entry._asdict())
+                               for entry in options['scenario'].entries]
+    if options.get('resolver') is not None:
+        options['resolver'] = [[host, port, addresses] for (host, port),
+                               addresses in options['resolver'].overrides
+                               .items()]
+    return options
+
+
+def load_options(options):
+    """Rebuilds the options given by :func:`dump_options`.
+
+    Raises a ValueError for the options an agent doesn't accept.
+    """
+    options = dict(options)
+    unknown = set(options) - _RUN_OPTIONS
+    if unknown:
+        raise ValueError('Unsupported options %s' % ', '.join(sorted(unknown)))
+    if options.get('data') is not None and \
+            not isinstance(options['data'], _TEXT):
+        raise ValueError('The data must be a string')
+    if options.get('profile') is not None:
+        options['profile'] = Profile([Stage(*stage) for stage
+                                      in options['profile']['stages']],
+                                     options['profile']['labels'])
+    if options.get('scenario') is not None:
+        options['scenario'] = Scenario.parse(options['scenario'])
+    if options.get('resolver') is not None:
+        options['resolver'] = Resolver(
+            ((host, port), addresses)
+            for host, port, addresses in options['resolver'])
+    return options
+
+
+class Agent(object):
+    """Runs the loads pushed by coordinators, one at a time."""
+
+    def __init__(self):
+        self._running = Semaphore()
+
+    def handle(self, sock, address):
+        sock.settimeout(_TIMEOUT)
+        reader = sock.makefile('rb')
+        try:
+            if not self._running.acquire(blocking=False):
+                _send(sock, {'error': 'The agent is busy with another run'})
+                return
+            try:
+                self._run(sock, reader)
+            finally:
+                self._running.release()
+        except (AgentError, socket.error):
+            # the coordinator is gone, nothing left to tell it
+            pass
+        finally:
+            reader.close()
+            sock.close()
+
+    def _run(self, sock, reader):
+        # boom.boom runs the distributed loads, it imports this module
+        from boom.boom import load
+
+        try:
+            options = load_options(_receive(reader, 'run'))
+        except (KeyError, TypeError, ValueError) as e:
+            _send(sock, {'error': 'Invalid run: %s' % e})
+            return
+        _send(sock, {'ready': True})
+
+        start = _receive(reader, 'start')
+        heartbeat = spawn(_beat, sock)
+        try:
+            sleep(max(0, start - time.time()))
+            res = load(quiet=True, **options)
+        except Exception as e:
+            _send(sock, {'error': '%s: %s' % (e.__class__.__name__, e)})
+            return
+        finally:
+            heartbeat.kill()
+        _send(sock, {'results': res.to_dict()})
+
+
+def _beat(sock):
+    """Tells the coordinator the run goes on, until killed."""
+    try:
+        while True:
+            sleep(_HEARTBEAT)
+            _send(sock, {'running': True})
+    except socket.error:
+        # the end of the run tells the coordinator is gone
+        pass
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT):
+    """Runs an agent on *host* and *port* until interrupted. Other
+    machines can only reach it with a *host* other than the loopback,
+    ``0.0.0.0`` for every interface."""
+    patch()
+    server = StreamServer((host, port), Agent().handle)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def coordinate(agents, url, requests=None, duration=None, concurrency=1,
+               method='GET', data=None, ct='text/plain', auth=None,
+               **options):
+    """Runs :func:`boom.boom.load` on the *agents*, a list of (host,
+    port), and returns their merged RunResults.
+
+    The other arguments are the ones of :func:`boom.boom.load`, they must
+    be JSON serializable but for the ``profile``, ``scenario`` and
+    ``resolver``. The *requests*, the *concurrency*, and the ``rate`` and
+    ``profile`` are split between the agents, fewer agents being
+    used when there are not enough calls for all of them. Raises an
+    :class:`AgentError` when an agent can't be reached, fails, goes
+    silent, or is still running well after the *duration*.
+    """
+    patch()
+    count = max(1, min(len(agents), concurrency,
+                       requests if requests is not None else concurrency))
+    agents = agents[:count]
+    profile = options.get('profile')
+    if options.get('rate') is not None:
+        options['rate'] /= float(count)
+        if profile is not None:
+            options['profile'] = profile.scaled(1. / count)
+    connections = []
+
+    try:
+        for index, (host, port) in enumerate(agents):
+            try:
+                sock = socket.create_connection((host, port), _TIMEOUT)
+            except socket.error as e:
+                raise AgentError('Could not reach the agent %s:%d (%s)' % (
+                    host, port, e))
+            connections.append((sock, sock.makefile('rb'), host, port))
+
+            run = dict(options, url=url, duration=duration, method=method,
+                       data=data, ct=ct, auth=auth,
+                       concurrency=share(concurrency, count, index),
+                       requests=(share(requests, count, index)
+                                 if requests is not None else None))
+            if profile is not None and options.get('rate') is None:
+                run['profile'] = profile.shared(count, index)
+            if run.get('resolver') is not None:
+                run['resolver'] = Resolver(run['resolver'].overrides,
+                                           offset=index)
+            _send(sock, {'run': dump_options(run)})
+
+        for sock, reader, host, port in connections:
+            try:
+                _receive(reader, 'ready')
+            except AgentError as e:
+                raise AgentError('%s:%d: %s' % (host, port, e))
+
+        start = time.time() + _START_DELAY
+        for sock, reader, host, port in connections:
+            _send(sock, {'start': start})
+            sock.settimeout(_HEARTBEAT * 3)
+
+        deadline = (start + duration + _RESULTS_MARGIN
+                    if duration is not None else None)
+        res = RunResults(None, quiet=True)
+        res.total_time = 0
+        for sock, reader, host, port in connections:
+            try:
+                results = _receive(reader, 'results', deadline)
+            except AgentError as e:
+                raise AgentError('%s:%d: %s' % (host, port, e))
+            res.merge(RunResults.from_dict(results))
+        return res
+    except socket.error as e:
+        raise AgentError('Lost an agent (%s)' % e)
+    finally:
+        for sock, reader, host, port in connections:
+            reader.close()
+            sock.close()
@@ -0,0 +1,404 @@
+"""HTTP client engines sending the calls of a run.
+
+An engine is built with the RunResults of the run, its concurrency,
+whether connections are kept alive and optionally a
+:class:`boom.resolver.Resolver` spreading its connections over the
+addresses of the hosts, and sends calls with
+``request(method, url, headers=None, data=None, auth=None)``. Failed
+calls raise a :class:`requests.RequestException`, and a response has at
+least a ``status_code``, ``headers`` and ``content``. With a resolver,
+responses and connection errors have the ``address`` of their
+connection. With a :class:`boom.sockets.SocketOptions` as ``sockets``
+option, their sockets are bound and set up as it says.
+
+``prepare()`` takes the same arguments and does the work which doesn't
+change from a call to the next, ``send()`` sends a prepared call. A
+:class:`Template` prepares the call of a run once when it can.
+
+- requests: the default, calls go through a :class:`requests.Session`
+  and post hooks get full :class:`requests.Response` objects.
+- urllib3: calls go straight to the urllib3 connection pools, skipping
+  the prepared requests, hooks, cookies and adapters of Requests.
+- socket: a minimal HTTP/1.1 client over (gevent) sockets, sending
+  request bytes serialized by ``prepare()`` and reading responses with a
+  few ``readline`` calls. It knows about Content-Length and chunked bodies,
+  nothing else: no redirects, no cookies, no compression.
+- http2: calls are multiplexed as HTTP/2 streams over a few
+  connections, see :mod:`boom.http2`.
+
+The lean engines spend a lot less CPU per call than Requests, which is
+what caps the throughput of a process against a fast server. See the
+README for measures.
+"""
+import socket
+import ssl
+from base64 import b64encode
+from functools import partial
+
+from requests import Request, exceptions
+from requests.packages.urllib3.exceptions import HTTPError
+from requests.packages.urllib3.util import parse_url
+
+from boom.session import CountingPoolManager, get_session
+from boom.sockets import SocketOptions
+from boom.util import monotonic, patch, resolve_name
+
+
+class Response(object):
+    """The response of a lean engine."""
+
+    __slots__ = ('status_code', 'headers', 'content', 'address')
+
+    def __init__(self, status_code, headers, content, address=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.address = address
+
+
+def connection_error(exc, address=None):
+    """Returns the ConnectionError to raise for *exc*, which happened on
+    a connection to *address*."""
+    error = exceptions.ConnectionError(exc)
+    error.address = address
+    return error
+
+
+def _auth_header(auth):
+    credentials = ('%s:%s' % auth).encode('latin-1')
+    return 'Basic ' + b64encode(credentials).decode('ascii')
+
+
+def serialize(method, url, headers=None, data=None, auth=None,
+              keepalive=True):
+    """Returns the (scheme, host, port) to connect to for a call, and the
+    bytes of its HTTP/1.1 request.
+
+    When *data* is a memoryview, the request is the tuple of its head
+    bytes and of *data*, sent one after the other so that the body is
+    never copied.
+    """
+    parts = parse_url(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    lines = ['%s %s HTTP/1.1' % (method, parts.request_uri)]
+    names = set()
+
+    for name, value in (headers or {}).items():
+        names.add(name.lower())
+        lines.append('%s: %s' % (name, value))
+    if 'host' not in names:
+        lines.append('Host: %s' % parts.netloc)
+    if auth is not None:
+        lines.append('Authorization: %s' % _auth_header(auth))
+    if not keepalive:
+        lines.append('Connection: close')
+
+    if data is None:
+        body = b''
+    elif isinstance(data, (bytes, memoryview)):
+        body = data
+    else:
+        body = data.encode('utf-8')
+    if body or method in ('POST', 'PUT'):
+        lines.append('Content-Length: %d' % len(body))
+
+    head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    if isinstance(body, memoryview):
+        return (parts.scheme, parts.host, port), (head, body)
+    return (parts.scheme, parts.host, port), head + body
+
+
+class RequestsEngine(object):
+    """Sends the calls through a :class:`requests.Session`."""
+
+    def __init__(self, results=None, concurrency=1, keepalive=True,
+                 resolver=None, sockets=None):
+        self.session = get_session(results, concurrency, keepalive, resolver,
+                                   sockets)
+
+    def request(self, method, url, **options):
+        return self.session.request(method, url, **options)
+
+    def prepare(self, method, url, headers=None, data=None, auth=None):
+        # what Session.request does before sending, the cookies of the
+        # session are merged once.
+        session = self.session
+        request = session.prepare_request(Request(
+            method, url, headers=headers, data=data, auth=auth))
+        settings = session.merge_environment_settings(
+            request.url, {}, None, None, None)
+        return request, settings
+
+    def send(self, prepared):
+        request, settings = prepared
+        return self.session.send(request, **settings)
+
+    def close(self):
+        self.session.close()
+
+
+class Urllib3Engine(object):
+    """Sends the calls through urllib3 connection pools."""
+
+    def __init__(self, results=None, concurrency=1, keepalive=True,
+                 resolver=None, sockets=None):
+        self.results = results
+        self.keepalive = keepalive
+        self.manager = CountingPoolManager(results, maxsize=concurrency,
+                                           resolver=resolver, sockets=sockets)
+
+    def request(self, method, url, headers=None, data=None, auth=None):
+        return self.send(self.prepare(method, url, headers, data, auth))
+
+    def prepare(self, method, url, headers=None, data=None, auth=None):
+        headers = dict(headers or {})
+        if auth is not None:
+            headers['Authorization'] = _auth_header(auth)
+        if not self.keepalive:
+            headers['Connection'] = 'close'
+        return method, url, data, headers
+
+    def send(self, prepared):
+        method, url, data, headers = prepared
+        try:
+            response = self.manager.urlopen(
+                method, url, body=data, headers=headers, retries=False,
+                redirect=False, preload_content=False)
+            conn = response.connection
+            address = getattr(conn, 'address', None)
+            start = monotonic()
+            content = response.read()
+            if self.results is not None:
+                self.results.phases['body'].append(monotonic() - start)
+            if not self.keepalive and conn is not None:
+                # the server closes it, the pool must not reuse it. The
+                # connection may already be back in the pool.
+                conn.close()
+            response.release_conn()
+        except HTTPError as exc:
+            raise connection_error(exc, getattr(exc, 'address', None))
+
+        return Response(response.status, response.headers, content, address)
+
+    def close(self):
+        self.manager.clear()
+
+
+class _Connection(object):
+    """A socket to a host and the file reading from it."""
+
+    def __init__(self, sock, address=None):
+        self.sock = sock
+        self.address = address
+        self.reader = sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class SocketEngine(object):
+    """Sends the calls with a minimal HTTP/1.1 client.
+
+    Idle connections are kept per host, up to *concurrency* of them.
+    """
+
+    def __init__(self, results=None, concurrency=1, keepalive=True,
+                 resolver=None, sockets=None):
+        self.results = results
+        self.concurrency = concurrency
+        self.keepalive = keepalive
+        self.resolver = resolver
+        self.sockets = sockets or SocketOptions()
+        self._idle = {}
+        self._ssl_context = None
+
+    def _record(self, phase, duration):
+        if self.results is not None:
+            self.results.phases[phase].append(duration)
+
+    def _connect(self, target):
+        scheme, host, port = target
+        address = None
+        try:
+            if self.resolver is not None:
+                address = self.resolver.pick(host, port)
+            start = monotonic()
+            sock = self.sockets.connect((address or host, port))
+            self._record('connect', monotonic() - start)
+
+            if scheme == 'https':
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                start = monotonic()
+                sock = self._ssl_context.wrap_socket(sock,
+                                                     server_hostname=host)
+                self._record('tls', monotonic() - start)
+        except (socket.error, ssl.SSLError) as exc:
+            raise connection_error(exc, address)
+
+        if self.results is not None:
+            self.results.new_connections += 1
+        return _Connection(sock, address)
+
+    def _read_response(self, conn, method, start):
+        reader = conn.reader
+        line = reader.readline()
+        if not line:
+            raise EOFError('Connection closed by the server')
+        status = int(line.split(None, 2)[1])
+        headers = {}
+
+        while True:
+            line = reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        self._record('ttfb', monotonic() - start)
+        start = monotonic()
+        keepalive = (self.keepalive and
+                     headers.get('connection', '').lower() != 'close')
+
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            content = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(reader.readline().split(b';', 1)[0], 16)
+                if size == 0:
+                    break
+                chunks.append(reader.read(size))
+                reader.readline()
+            # trailers
+            while reader.readline() not in (b'\r\n', b'\n', b''):
+                pass
+            content = b''.join(chunks)
+        elif 'content-length' in headers:
+            content = reader.read(int(headers['content-length']))
+        else:
+            content = reader.read()
+            keepalive = False
+
+        self._record('body', monotonic() - start)
+        return Response(status, headers, content, conn.address), keepalive
+
+    def request(self, method, url, headers=None, data=None, auth=None):
+        return self.send(self.prepare(method, url, headers, data, auth))
+
+    def prepare(self, method, url, headers=None, data=None, auth=None):
+        target, raw = serialize(method, url, headers, data, auth,
+                                self.keepalive)
+        return method, target, raw
+
+    def send(self, prepared):
+        method, target, raw = prepared
+        idle = self._idle.setdefault(target, [])
+
+        while True:
+            reused = bool(idle)
+            conn = idle.pop() if reused else self._connect(target)
+
+            try:
+                start = monotonic()
+                if isinstance(raw, tuple):
+                    for part in raw:
+                        conn.sock.sendall(part)
+                else:
+                    conn.sock.sendall(raw)
+                response, keepalive = self._read_response(conn, method,
+                                                          start)
+            except (socket.error, EOFError, ValueError, IndexError) as exc:
+                conn.close()
+                if reused:
+                    # the server closed the idle connection, try again
+                    continue
+                raise connection_error(exc, conn.address)
+            break
+
+        if reused and self.results is not None:
+            self.results.reused_connections += 1
+
+        if keepalive and len(idle) < self.concurrency:
+            idle.append(conn)
+        else:
+            conn.close()
+        return response
+
+    def close(self):
+        for idle in self._idle.values():
+            for conn in idle:
+                conn.close()
+        self._idle.clear()
+
+
+class Template(object):
+    """The call of a run, prepared once by *engine* when it can.
+
+    *options* are the keyword arguments of ``engine.request()``. When
+    the data is a callable or there is a *pre_hook*, the call changes
+    every time and is built by :meth:`build`, otherwise ``prepared`` is
+    ready to be given to ``engine.send()``. The *post_hook* is None when
+    there is none.
+
+    *endpoint* is the index of the call in the scenario of the run, None
+    when the run has a single URL.
+    """
+
+    def __init__(self, engine, method, url, options, pre_hook=None,
+                 post_hook=None, endpoint=None):
+        self.engine = engine
+        self.endpoint = endpoint
+        self.method = partial(engine.request, method)
+        self.url = url
+        self.options = options
+        self.pre_hook = pre_hook
+        self.post_hook = post_hook
+        self.dynamic = pre_hook is not None or callable(options.get('data'))
+        self.prepared = (None if self.dynamic
+                         else engine.prepare(method, url, **options))
+
+    def build(self):
+        """Returns the (method, url, options) of a dynamic call.
+
+        ``method(url, **options)`` sends the call.
+        """
+        method, url, options = self.method, self.url, self.options
+        if callable(options.get('data')):
+            options = dict(options)
+            options['data'] = options['data'](method, url, options)
+        if self.pre_hook is not None:
+            method, url, options = self.pre_hook(method, url, dict(options))
+        return method, url, options
+
+    def pick(self):
+        # a run with a single URL always sends the same call, see
+        # boom.scenario.Mix for the others
+        return self
+
+
+ENGINES = {'requests': RequestsEngine,
+           'urllib3': Urllib3Engine,
+           'socket': SocketEngine,
+           # imported when used, it needs the optional h2 library
+           'http2': 'boom.http2.HTTP2Engine'}
+
+
+def get_engine(name, results=None, concurrency=1, keepalive=True,
+               resolver=None, **options):
+    """Returns the engine called *name* for a run. *options* are given to
+    engines taking more arguments, like the http2 one. Their ``sockets``
+    option can be given as the arguments of a :class:`boom.sockets.
+    SocketOptions`."""
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        raise ValueError('Unknown engine %r' % name)
+    if not callable(engine):
+        engine = resolve_name(engine)
+    # the engines are cooperative through the gevent sockets
+    patch()
+    if isinstance(options.get('sockets'), dict):
+        options['sockets'] = SocketOptions(**options['sockets'])
+    return engine(results, concurrency, keepalive, resolver, **options)
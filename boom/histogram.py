@@ -0,0 +1,164 @@
+"""Constant-memory latency histogram.
+
+Durations are counted in logarithmic buckets, so the memory used by a
+:class:`Histogram` depends on the range of the values it saw and on its
+precision, never on the number of values. Count, sum, min, max and
+variance are tracked exactly with Welford's streaming algorithm.
+"""
+import math
+from collections import defaultdict
+
+
+class Histogram(object):
+    """Log-bucketed histogram of durations, in seconds.
+
+    The options are:
+        precision   Relative width of a bucket. With the default of 0.01,
+                    a value is known within 1% once put in a bucket.
+        lowest      Values below this one all go in the first bucket.
+    """
+
+    def __init__(self, precision=0.01, lowest=1e-6):
+        self.precision = precision
+        self.lowest = lowest
+        self._log_base = math.log1p(precision)
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.sum = 0.
+        self.mean = 0.
+        self.min = None
+        self.max = None
+        self._m2 = 0.
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _value(self, index):
+        """Returns the value standing for the bucket *index*."""
+        if index == 0:
+            return self.lowest
+        return self.lowest * math.exp((index - 0.5) * self._log_base)
+
+    def append(self, value):
+        """Adds a value to the histogram."""
+        self.buckets[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def merge(self, other):
+        """Adds all the values of *other* to this histogram.
+
+        Both histograms must share the same precision and lowest value.
+        """
+        if other.count == 0:
+            return self
+
+        if (other.precision, other.lowest) != (self.precision, self.lowest):
+            raise ValueError('Cannot merge histograms with different '
+                             'buckets')
+
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.sum += other.sum
+
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+        return self
+
+    def percentiles(self, percents):
+        """Returns the values at the given percents, as a list.
+
+        The buckets are walked once in order, whatever the number of
+        percents asked. Values are exact within the precision of the
+        histogram and never out of its min and max.
+        """
+        if self.count == 0:
+            return [0.] * len(percents)
+
+        ranks = sorted((max(1, int(math.ceil(percent / 100. * self.count))),
+                        position) for position, percent in enumerate(percents))
+        values = [None] * len(percents)
+        indexes = iter(sorted(self.buckets))
+        seen = 0
+
+        for rank, position in ranks:
+            if rank == 1:
+                values[position] = self.min
+                continue
+            if rank == self.count:
+                values[position] = self.max
+                continue
+            while seen < rank:
+                index = next(indexes)
+                seen += self.buckets[index]
+            value = self._value(index)
+            values[position] = min(max(value, self.min), self.max)
+
+        return values
+
+    def percentile(self, percent):
+        return self.percentiles([percent])[0]
+
+    def to_dict(self):
+        """Returns a JSON serializable summary of the histogram."""
+        return {'precision': self.precision,
+                'lowest': self.lowest,
+                'buckets': dict((str(index), count)
+                                for index, count in self.buckets.items()),
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.mean,
+                'min': self.min,
+                'max': self.max,
+                'm2': self._m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a histogram from the output of :meth:`to_dict`."""
+        histogram = cls(data['precision'], data['lowest'])
+        for index, count in data['buckets'].items():
+            histogram.buckets[int(index)] = count
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.mean = data['mean']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        histogram._m2 = data['m2']
+        return histogram
+
+    @property
+    def variance(self):
+        if self.count == 0:
+            return 0.
+        return self._m2 / self.count
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
@@ -0,0 +1,359 @@
+"""HTTP/2 engine, multiplexing the calls of a run as streams.
+
+The engine opens up to *connections* connections per host and sends the
+calls as concurrent streams over them, at most *streams* at once on a
+connection, or fewer when the server's ``SETTINGS_MAX_CONCURRENT_STREAMS``
+says so. A call goes to the connection with the fewest streams in flight,
+so the concurrency of a run is spread over a few sockets.
+
+HTTPS connections negotiate h2 with ALPN. Plain HTTP URLs are sent with
+prior knowledge, without the HTTP/1.1 upgrade dance.
+
+Besides the usual accounting, the ``streams`` counters of the RunResults
+tell how many streams were opened, reset by the server (RST_STREAM),
+stalled by flow control while sending their body, and how many
+connections were closed by a GOAWAY.
+
+It needs the `h2 <https://python-hyper.org/projects/h2>`_ library, which
+is optional.
+"""
+import socket
+import ssl
+
+from gevent import spawn
+from gevent.event import Event
+from gevent.lock import RLock, Semaphore
+from requests.packages.urllib3.util import parse_url
+
+from boom.engines import Response, _auth_header, connection_error
+from boom.sockets import SocketOptions
+from boom.util import monotonic
+
+try:
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2 import events, exceptions
+except ImportError:
+    H2Connection = None
+
+
+# headers which have no meaning in HTTP/2
+_HOP_HEADERS = ('connection', 'host', 'keep-alive', 'proxy-connection',
+                'transfer-encoding', 'upgrade')
+
+
+class _Stream(object):
+    """A call waiting for its response."""
+
+    def __init__(self, start):
+        self.start = start
+        self.status = None
+        self.headers = {}
+        self.chunks = []
+        self.error = None
+        self.done = Event()
+
+
+class _Connection(object):
+    """An HTTP/2 connection and the greenlet reading from it."""
+
+    def __init__(self, sock, address, streams, results):
+        self.sock = sock
+        self.address = address
+        self.results = results
+        self.slots = Semaphore(streams)
+        self.streams = {}
+        self.error = None
+        self._lock = RLock()
+        self._changed = Event()
+
+        self.conn = H2Connection(H2Configuration(client_side=True,
+                                                 header_encoding='latin-1'))
+        self.conn.initiate_connection()
+        self.sock.sendall(self.conn.data_to_send())
+        self._reader = spawn(self._read)
+
+    @property
+    def closed(self):
+        return self.error is not None
+
+    def _count(self, name):
+        if self.results is not None:
+            self.results.streams[name] += 1
+
+    def _record(self, phase, duration):
+        if self.results is not None:
+            self.results.phases[phase].append(duration)
+
+    def _wake(self):
+        # wakes up the calls waiting for a stream slot or a window
+        self._changed, changed = Event(), self._changed
+        changed.set()
+
+    def _flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+
+    def _read(self):
+        try:
+            while True:
+                data = self.sock.recv(65535)
+                if not data:
+                    raise EOFError('Connection closed by the server')
+                with self._lock:
+                    for event in self.conn.receive_data(data):
+                        self._handle(event)
+                    self._flush()
+                self._wake()
+        except (socket.error, EOFError, exceptions.ProtocolError) as exc:
+            self._fail(exc)
+
+    def _handle(self, event):
+        stream = self.streams.get(getattr(event, 'stream_id', None))
+
+        if isinstance(event, events.ResponseReceived) and stream is not None:
+            headers = dict(event.headers)
+            stream.status = int(headers.pop(':status'))
+            stream.headers = headers
+            self._record('ttfb', monotonic() - stream.start)
+            stream.start = monotonic()
+        elif isinstance(event, events.DataReceived):
+            self.conn.acknowledge_received_data(event.flow_controlled_length,
+                                                event.stream_id)
+            if stream is not None:
+                stream.chunks.append(event.data)
+        elif isinstance(event, events.StreamEnded) and stream is not None:
+            self._record('body', monotonic() - stream.start)
+            stream.done.set()
+        elif isinstance(event, events.StreamReset) and stream is not None:
+            if event.remote_reset:
+                self._count('reset')
+            stream.error = 'Stream reset with error code %d' % (
+                event.error_code)
+            stream.done.set()
+        elif isinstance(event, events.ConnectionTerminated):
+            # no new streams, the ones the server took may still end
+            self._count('goaway')
+            self.error = EOFError('Connection closed by a GOAWAY with error '
+                                  'code %d' % event.error_code)
+            for stream_id, stream in self.streams.items():
+                if event.last_stream_id is None or \
+                        stream_id > event.last_stream_id:
+                    stream.error = self.error
+                    stream.done.set()
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        for stream in self.streams.values():
+            if not stream.done.is_set():
+                stream.error = self.error
+                stream.done.set()
+        self.sock.close()
+        self._wake()
+
+    def _open(self, headers, end_stream):
+        """Sends the headers of a new stream once the server allows it,
+        and returns its id and its :class:`_Stream`."""
+        while True:
+            changed = self._changed
+            with self._lock:
+                if self.error is not None:
+                    raise connection_error(self.error, self.address)
+                conn = self.conn
+                if conn.open_outbound_streams < \
+                        conn.remote_settings.max_concurrent_streams:
+                    stream_id = conn.get_next_available_stream_id()
+                    stream = self.streams[stream_id] = _Stream(monotonic())
+                    conn.send_headers(stream_id, headers,
+                                      end_stream=end_stream)
+                    self._flush()
+                    self._count('opened')
+                    return stream_id, stream
+            changed.wait()
+
+    def _send_body(self, stream_id, stream, body):
+        """Sends *body* as the flow control windows allow it."""
+        offset, size = 0, len(body)
+        while offset < size:
+            changed = self._changed
+            with self._lock:
+                if stream.done.is_set():
+                    return
+                conn = self.conn
+                window = min(conn.local_flow_control_window(stream_id),
+                             conn.max_outbound_frame_size, size - offset)
+                if window > 0:
+                    conn.send_data(stream_id, body[offset:offset + window],
+                                   end_stream=offset + window == size)
+                    self._flush()
+                    offset += window
+                    continue
+                self._count('stalls')
+            changed.wait()
+
+    def request(self, headers, body):
+        with self.slots:
+            stream_id, stream = self._open(headers, not body)
+            try:
+                if body:
+                    self._send_body(stream_id, stream, body)
+                stream.done.wait()
+            except (socket.error, exceptions.ProtocolError) as exc:
+                self._fail(exc)
+            finally:
+                self.streams.pop(stream_id, None)
+                self._wake()
+
+        if stream.error is not None:
+            raise connection_error(stream.error, self.address)
+        return Response(stream.status, stream.headers,
+                        b''.join(stream.chunks), self.address)
+
+    def close(self):
+        with self._lock:
+            if self.error is None:
+                try:
+                    self.conn.close_connection()
+                    self._flush()
+                except (socket.error, exceptions.ProtocolError):
+                    pass
+        self._reader.kill()
+        self.sock.close()
+
+
+class HTTP2Engine(object):
+    """Sends the calls as HTTP/2 streams over up to *connections*
+    connections per host, with at most *streams* streams in flight on
+    each of them.
+
+    The connections are always kept alive.
+    """
+
+    def __init__(self, results=None, concurrency=1, keepalive=True,
+                 resolver=None, connections=1, streams=100, sockets=None):
+        if H2Connection is None:
+            raise ValueError('The http2 engine needs the h2 library')
+        self.results = results
+        self.resolver = resolver
+        self.connections = connections
+        self.streams = streams
+        self.sockets = sockets or SocketOptions()
+        self._pools = {}
+        # the connections being opened, an Event set when done, per host
+        self._opening = {}
+        self._lock = RLock()
+        self._ssl_context = None
+
+    def _record(self, phase, duration):
+        if self.results is not None:
+            self.results.phases[phase].append(duration)
+
+    def _connect(self, target):
+        scheme, host, port = target
+        address = None
+        try:
+            if self.resolver is not None:
+                address = self.resolver.pick(host, port)
+            start = monotonic()
+            sock = self.sockets.connect((address or host, port))
+            self._record('connect', monotonic() - start)
+
+            if scheme == 'https':
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                    self._ssl_context.set_alpn_protocols(['h2'])
+                start = monotonic()
+                sock = self._ssl_context.wrap_socket(sock,
+                                                     server_hostname=host)
+                self._record('tls', monotonic() - start)
+                if sock.selected_alpn_protocol() != 'h2':
+                    sock.close()
+                    raise ssl.SSLError('%s does not speak h2' % host)
+
+            connection = _Connection(sock, address, self.streams,
+                                     self.results)
+        except (socket.error, ssl.SSLError) as exc:
+            raise connection_error(exc, address)
+
+        if self.results is not None:
+            self.results.new_connections += 1
+        return connection
+
+    def _connection(self, target):
+        """Returns the connection with the fewest streams in flight, a new
+        one while there are less than *connections* of them.
+
+        Connections are opened outside of the lock, the calls only wait
+        for them when no other connection to their host is open.
+        """
+        while True:
+            with self._lock:
+                pool = self._pools.setdefault(target, [])
+                pool[:] = [conn for conn in pool if not conn.closed]
+                opening = self._opening.setdefault(target, [])
+                if len(pool) + len(opening) < self.connections:
+                    done = Event()
+                    opening.append(done)
+                    break
+                if pool:
+                    if self.results is not None:
+                        self.results.reused_connections += 1
+                    return min(pool, key=lambda conn: len(conn.streams))
+                pending = opening[0]
+            pending.wait()
+
+        try:
+            connection = self._connect(target)
+            with self._lock:
+                pool.append(connection)
+            return connection
+        finally:
+            with self._lock:
+                opening.remove(done)
+            done.set()
+
+    def request(self, method, url, headers=None, data=None, auth=None):
+        return self.send(self.prepare(method, url, headers, data, auth))
+
+    def prepare(self, method, url, headers=None, data=None, auth=None):
+        parts = parse_url(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        authority = parts.netloc
+        names = {}
+
+        for name, value in (headers or {}).items():
+            name = name.lower()
+            if name == 'host':
+                authority = value
+            elif name not in _HOP_HEADERS:
+                names[name] = str(value)
+        if auth is not None:
+            names['authorization'] = _auth_header(auth)
+
+        if data is None:
+            body = b''
+        elif isinstance(data, (bytes, memoryview)):
+            body = data
+        else:
+            body = data.encode('utf-8')
+        if body or method in ('POST', 'PUT'):
+            names['content-length'] = str(len(body))
+
+        request_headers = [(':method', method), (':scheme', parts.scheme),
+                           (':authority', authority),
+                           (':path', parts.request_uri)]
+        request_headers.extend(names.items())
+        return (parts.scheme, parts.host, port), request_headers, body
+
+    def send(self, prepared):
+        target, headers, body = prepared
+        return self._connection(target).request(headers, body)
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                for conn in pool:
+                    conn.close()
+            self._pools.clear()
@@ -0,0 +1,145 @@
+"""Streams the result of every call to a file, for offline analysis.
+
+Calls only append a tuple to an in-memory batch. A writer greenlet
+encodes the batch and hands it to a thread doing the actual write, so
+the calls never wait on the disk. A batch is written every
+``flush_interval`` seconds, or as soon as it holds ``batch`` records.
+
+Every record is made of:
+
+- timestamp: wall clock time at which the call started, in seconds,
+- latency: duration of the call, in seconds,
+- status: HTTP status code, 0 when the call failed,
+- bytes: size of the response body,
+- error: class name of the exception of a failed call, empty otherwise,
+- worker: index of the worker which made the call, 0 in --rate runs.
+
+The formats are CSV with a header line, JSON lines, and a binary format
+of fixed-size little-endian records described by :data:`BINARY_RECORD`.
+"""
+import csv
+import json
+import struct
+from collections import namedtuple
+
+from gevent import spawn
+from gevent.event import Event
+from gevent.fileobject import FileObjectThread
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+FORMATS = ('csv', 'jsonl', 'binary')
+Record = namedtuple('Record', ['timestamp', 'latency', 'status', 'bytes',
+                               'error', 'worker'])
+# timestamp, latency, status, bytes, worker and the error class name
+# padded with NUL bytes.
+BINARY_RECORD = struct.Struct('<ddHQI32s')
+
+
+def _encode_csv(records):
+    output = StringIO()
+    csv.writer(output, lineterminator='\n').writerows(records)
+    return output.getvalue()
+
+
+def _encode_jsonl(records):
+    return ''.join(json.dumps(dict(zip(Record._fields, record))) + '\n'
+                   for record in records)
+
+
+def _encode_binary(records):
+    pack = BINARY_RECORD.pack
+    return b''.join(pack(timestamp, latency, status, size, worker,
+                         error.encode('ascii', 'replace'))
+                    for timestamp, latency, status, size, error, worker
+                    in records)
+
+
+_ENCODERS = {'csv': _encode_csv, 'jsonl': _encode_jsonl,
+             'binary': _encode_binary}
+
+
+class ResultWriter(object):
+    """Writes the records of a run to *path* in the *fmt* format.
+
+    :meth:`write` is meant for the calls, :meth:`loop` for the writer
+    greenlet started by :meth:`start`. :meth:`close` writes what is left.
+    """
+
+    def __init__(self, path, fmt='csv', batch=1000, flush_interval=1.):
+        if fmt not in FORMATS:
+            raise ValueError('Unknown output format %r' % fmt)
+
+        self.path = path
+        self.format = fmt
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self._encode = _ENCODERS[fmt]
+        self._records = []
+        self._full = Event()
+        self._greenlet = None
+        self._file = FileObjectThread(path, 'wb' if fmt == 'binary'
+                                      else 'w')
+
+        if fmt == 'csv':
+            self._file.write(_encode_csv([Record._fields]))
+
+    def write(self, timestamp, latency, status, size, error, worker):
+        self._records.append((timestamp, latency, status, size, error,
+                              worker))
+        if len(self._records) >= self.batch:
+            self._full.set()
+
+    def flush(self):
+        records, self._records = self._records, []
+        self._full.clear()
+        if records:
+            self._file.write(self._encode(records))
+            self._file.flush()
+
+    def loop(self):
+        while True:
+            self._full.wait(self.flush_interval)
+            self.flush()
+
+    def start(self):
+        self._greenlet = spawn(self.loop)
+
+    def close(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+        self.flush()
+        self._file.close()
+
+
+def read(path, fmt='csv'):
+    """Yields the :class:`Record` of a file written by a
+    :class:`ResultWriter`."""
+    if fmt == 'binary':
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(BINARY_RECORD.size)
+                if len(data) < BINARY_RECORD.size:
+                    return
+                timestamp, latency, status, size, worker, error = \
+                    BINARY_RECORD.unpack(data)
+                yield Record(timestamp, latency, status, size,
+                             error.rstrip(b'\0').decode('ascii'), worker)
+    elif fmt == 'jsonl':
+        with open(path) as f:
+            for line in f:
+                yield Record(**json.loads(line))
+    elif fmt == 'csv':
+        with open(path) as f:
+            rows = csv.reader(f)
+            next(rows)
+            for timestamp, latency, status, size, error, worker in rows:
+                yield Record(float(timestamp), float(latency), int(status),
+                             int(size), error, int(worker))
+    else:
+        raise ValueError('Unknown output format %r' % fmt)
@@ -0,0 +1,59 @@
+"""Pools of request bodies read from files.
+
+A :class:`PayloadPool` memory-maps its files once, when it is built, and
+gives a read-only ``memoryview`` of one of them to every call. The
+HTTP clients send these views as they are, so the bodies are never read
+nor copied into Python strings: the pages come from the page cache
+straight to the socket, and the processes of a ``--processes`` run
+share them.
+
+A pool is a callable taking the ``(method, url, options)`` of a call,
+like the ``py:`` data callables, and it goes through the same path.
+"""
+import mmap
+import os
+import random
+from itertools import cycle
+
+
+ORDERS = ('round-robin', 'random')
+
+
+def _map(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class PayloadPool(object):
+    """Bodies mapped from *paths*, given in *order*: round-robin or
+    random."""
+
+    def __init__(self, paths, order='round-robin'):
+        if order not in ORDERS:
+            raise ValueError('Unknown payload order %r' % order)
+        if not paths:
+            raise ValueError('A payload pool needs at least one file')
+
+        self.paths = list(paths)
+        self.order = order
+        self.payloads = [_map(path) for path in self.paths]
+        self.size = sum(len(payload) for payload in self.payloads)
+        self._cycle = cycle(self.payloads)
+
+    @classmethod
+    def from_dir(cls, path, order='round-robin'):
+        """Builds a pool of the regular files of the directory *path*, in
+        the order of their names."""
+        paths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        return cls([item for item in paths if os.path.isfile(item)], order)
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def __call__(self, method=None, url=None, options=None):
+        if self.order == 'random':
+            return random.choice(self.payloads)
+        return next(self._cycle)
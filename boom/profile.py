@@ -0,0 +1,157 @@
+"""Load profiles, to change the load of a run over time.
+
+A profile is a list of stages. A stage either holds the load at a given
+level, or moves it linearly from one level to another, for a number of
+seconds. The level is the concurrency of the run, or its rate when the
+run is sending a fixed number of requests per second.
+
+On the command line, stages are separated by commas and written
+``LEVEL:SECONDS`` to hold a level or ``FROM-TO:SECONDS`` to ramp. For
+example, ``0-1000:60,1000:120,2000:30`` ramps up to 1000 in a minute,
+holds it for two minutes, then steps to 2000 for 30 more seconds.
+"""
+import random
+from collections import namedtuple
+from itertools import count
+
+from boom.util import share
+
+
+Stage = namedtuple('Stage', ['start', 'end', 'duration'])
+# seconds between two looks at the rate while a profile is at 0
+_IDLE_TICK = .1
+
+
+class Profile(object):
+    """A sequence of :class:`Stage`, levels being floats.
+
+    The *labels* of the stages name them in the results, their command
+    line definition by default. The parts of a profile split between
+    processes keep the labels of the whole.
+    """
+
+    def __init__(self, stages, labels=None):
+        if not stages:
+            raise ValueError('A profile needs at least one stage')
+        for stage in stages:
+            if stage.duration <= 0:
+                raise ValueError('Stages must last more than 0 seconds')
+            if stage.start < 0 or stage.end < 0:
+                raise ValueError('Levels must not be negative')
+
+        self.stages = list(stages)
+        self.labels = list(labels or [format_stage(stage)
+                                      for stage in stages])
+        self.duration = sum(stage.duration for stage in stages)
+        self.peak = max(max(stage.start, stage.end) for stage in stages)
+
+    def __str__(self):
+        return ','.join(format_stage(stage) for stage in self.stages)
+
+    def stage(self, elapsed):
+        """Returns the index of the stage running after *elapsed* seconds.
+
+        The last stage keeps on running once the profile is over.
+        """
+        for index, stage in enumerate(self.stages):
+            if elapsed < stage.duration:
+                return index
+            elapsed -= stage.duration
+        return len(self.stages) - 1
+
+    def level(self, elapsed):
+        """Returns the level after *elapsed* seconds."""
+        for stage in self.stages:
+            if elapsed < stage.duration:
+                progress = max(elapsed, 0) / float(stage.duration)
+                return stage.start + (stage.end - stage.start) * progress
+            elapsed -= stage.duration
+        return self.stages[-1].end
+
+    def scaled(self, factor):
+        """Returns a copy of the profile with all levels multiplied by
+        *factor*."""
+        return Profile([Stage(stage.start * factor, stage.end * factor,
+                              stage.duration) for stage in self.stages],
+                       self.labels)
+
+    def shared(self, parts, index):
+        """Returns the part *index* of the profile split in *parts*, of
+        whole levels, the levels of all parts adding up to the ones of the
+        profile. Meant for concurrency levels."""
+        return Profile([Stage(share(int(round(stage.start)), parts, index),
+                              share(int(round(stage.end)), parts, index),
+                              stage.duration) for stage in self.stages],
+                       self.labels)
+
+    @classmethod
+    def parse(cls, spec):
+        """Builds a profile from its command line definition."""
+        stages = []
+
+        for item in spec.split(','):
+            try:
+                levels, duration = item.strip().split(':')
+                if '-' in levels:
+                    start, end = levels.split('-')
+                else:
+                    start = end = levels
+                stages.append(Stage(float(start), float(end),
+                                    float(duration)))
+            except ValueError:
+                raise ValueError('Invalid stage %r, stages are LEVEL:SECONDS '
+                                 'or FROM-TO:SECONDS' % item)
+
+        return cls(stages)
+
+    @classmethod
+    def ramp(cls, level, ramp, duration):
+        """Builds a profile going from 0 to *level* in *ramp* seconds, then
+        holding it until *duration* seconds."""
+        stages = [Stage(0., float(level), float(ramp))]
+        if duration > ramp:
+            stages.append(Stage(float(level), float(level),
+                                float(duration - ramp)))
+        return cls(stages)
+
+
+def format_stage(stage):
+    """Returns the command line definition of a stage."""
+    if stage.start == stage.end:
+        return '%g:%g' % (stage.end, stage.duration)
+    return '%g-%g:%g' % (stage.start, stage.end, stage.duration)
+
+
+def arrivals(rate, start, poisson=False):
+    """Yields the times at which calls should be sent to get *rate* calls
+    per second from *start*.
+
+    Calls are evenly spaced, or follow a Poisson process when *poisson*
+    is True. *rate* can also be a :class:`Profile` of rates, the times
+    stop when it ends at 0.
+    """
+    if not isinstance(rate, Profile):
+        if not poisson:
+            for index in count():
+                yield start + index / float(rate)
+
+        intended = start
+        while True:
+            yield intended
+            intended += random.expovariate(rate)
+
+    elapsed = 0.
+    while True:
+        current = rate.level(elapsed)
+        if current <= 0:
+            if elapsed >= rate.duration:
+                # the last stage stays at 0 for ever
+                return
+            # nothing to send yet, check the rate again a bit later
+            elapsed += _IDLE_TICK
+            continue
+        yield start + elapsed
+        if poisson:
+            elapsed += random.expovariate(current)
+        else:
+            elapsed += 1. / current
@@ -0,0 +1,94 @@
+"""Replay of access logs.
+
+:class:`AccessLog` reads a log in the common or combined format of
+Apache and nginx, lazily and line by line so that huge logs never sit
+in memory. Gzipped logs are read as is.
+
+:func:`timed` gives the time at which every request of a log must be
+sent to keep the inter-arrival times of the log, optionally sped up.
+Logs only have a one second precision, so the requests of a second all
+go at once.
+"""
+import calendar
+import gzip
+import re
+from collections import namedtuple
+
+from boom.util import PY3
+
+
+Request = namedtuple('Request', ['timestamp', 'method', 'path'])
+
+# host ident user [10/Oct/2000:13:55:36 -0700] "GET /path HTTP/1.0" ...
+_LINE = re.compile(r'\S+ \S+ .*?\[(\d\d)/(\w{3})/(\d{4}):(\d\d):(\d\d):(\d\d)'
+                   r' ([+-])(\d\d)(\d\d)\] "(\S+) (\S+)')
+_MONTHS = dict((name, index + 1) for index, name in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+     'Nov', 'Dec')))
+
+
+def parse_line(line):
+    """Returns the :class:`Request` of a log line, or None when the line
+    isn't in the common log format."""
+    match = _LINE.match(line)
+    if match is None:
+        return None
+
+    (day, month, year, hour, minute, second, sign, tz_hours, tz_minutes,
+     method, path) = match.groups()
+    if month not in _MONTHS:
+        return None
+
+    timestamp = calendar.timegm((int(year), _MONTHS[month], int(day),
+                                 int(hour), int(minute), int(second)))
+    offset = int(tz_hours) * 3600 + int(tz_minutes) * 60
+    timestamp -= offset if sign == '+' else -offset
+    return Request(timestamp, method, path)
+
+
+class AccessLog(object):
+    """Iterates over the requests of the log at *path*.
+
+    Lines which can't be parsed are skipped and counted in ``skipped``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.skipped = 0
+
+    def _open(self):
+        # bytes out of UTF-8 are replaced rather than ending the replay
+        if not PY3:
+            return (gzip.open if self.path.endswith('.gz') else open)(
+                self.path, 'rb')
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, 'rt', encoding='utf-8',
+                             errors='replace')
+        return open(self.path, encoding='utf-8', errors='replace')
+
+    def check(self):
+        """Raises an EnvironmentError when the log can't be read."""
+        with self._open() as log:
+            log.read(1)
+
+    def __iter__(self):
+        with self._open() as log:
+            for line in log:
+                request = parse_line(line)
+                if request is None:
+                    self.skipped += 1
+                    continue
+                yield request
+
+
+def timed(items, start, speed=1.):
+    """Yields (time, item) for every (timestamp, item) of *items*.
+
+    The first item is sent at *start* and the others keep their distance
+    to it in the log, divided by *speed*.
+    """
+    first = None
+    for timestamp, item in items:
+        if first is None:
+            first = timestamp
+        yield start + (timestamp - first) / float(speed), item
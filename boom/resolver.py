@@ -0,0 +1,73 @@
+"""Resolution of host names to all their addresses.
+
+A :class:`Resolver` resolves a host name once with ``getaddrinfo`` and
+keeps all its IPv4 and IPv6 addresses, so that the connections of a run
+are spread over a DNS round-robin fleet instead of all going to its
+first node. Every new connection to a host goes to the next of its
+addresses.
+
+Overrides, given like curl's ``--resolve host:port:addr[,addr]...``,
+replace the system resolver for a host and port.
+"""
+import socket
+from itertools import cycle
+
+
+def parse_override(value):
+    """Returns the ((host, port), addresses) of a ``host:port:addr``
+    override. IPv6 addresses can be in brackets."""
+    try:
+        host, port, addresses = value.split(':', 2)
+        port = int(port)
+    except ValueError:
+        raise ValueError('%r is not of the form host:port:addr' % value)
+
+    addresses = [address.strip().strip('[]')
+                 for address in addresses.split(',')]
+    if not host or not all(addresses):
+        raise ValueError('%r is not of the form host:port:addr' % value)
+    return (host, port), addresses
+
+
+class Resolver(object):
+    """Resolves (host, port) targets to lists of addresses, with
+    *overrides* mapping some of them to fixed addresses.
+
+    *offset* shifts the first address given for every target, so that
+    the processes of a run don't all start with the same one.
+    """
+
+    def __init__(self, overrides=None, offset=0):
+        self.overrides = dict(overrides or {})
+        self.offset = offset
+        self._addresses = {}
+        self._cycles = {}
+
+    def addresses(self, host, port):
+        """Returns the addresses of *host* for *port*, in the order of
+        the resolver. Raises :class:`socket.gaierror` when there is
+        none."""
+        target = (host, port)
+        if target in self.overrides:
+            return self.overrides[target]
+
+        if target not in self._addresses:
+            addresses = []
+            for info in socket.getaddrinfo(host, port, 0,
+                                           socket.SOCK_STREAM):
+                address = info[4][0]
+                if address not in addresses:
+                    addresses.append(address)
+            self._addresses[target] = addresses
+        return self._addresses[target]
+
+    def pick(self, host, port):
+        """Returns the address the next connection to *host* and *port*
+        goes to."""
+        target = (host, port)
+        if target not in self._cycles:
+            addresses = self.addresses(host, port)
+            shift = self.offset % len(addresses)
+            self._cycles[target] = cycle(addresses[shift:] +
+                                         addresses[:shift])
+        return next(self._cycles[target])
@@ -0,0 +1,389 @@
+"""Results of a run and the statistics computed from them.
+
+This module doesn't depend on gevent, so that the results of every
+backend, greenlets or asyncio, are the same objects.
+"""
+import re
+from collections import defaultdict, namedtuple, OrderedDict
+
+from requests import RequestException, exceptions
+
+from boom.histogram import Histogram
+from boom.session import PHASES
+from boom.sockets import is_exhaustion
+
+
+_PERCENTILES = (50, 90, 95, 99, 99.9)
+# addresses of objects in reprs, which make every message unique
+_OBJECT_ADDRESS = re.compile(r'0x[0-9a-fA-F]+')
+# characters of a message kept in the signature of its kind
+_MAX_MESSAGE = 500
+
+
+def _error(name, message):
+    """Rebuilds an error shipped as its class name and message."""
+    error = getattr(exceptions, name, None)
+    if not (isinstance(error, type) and issubclass(error, RequestException)):
+        error = RequestException
+    return error(message)
+
+
+class ErrorTable(object):
+    """The errors of a run, counted by kind.
+
+    Errors of the same class with the same message, once the addresses of
+    objects are masked, are of the same kind. At most *max_kinds* kinds
+    are kept, the errors of later ones are only counted in ``overflow``.
+    Every kind keeps its first *max_samples* errors as exemplars, without
+    their traceback.
+
+    ``len()`` gives the number of errors, and iterating gives the
+    exemplars.
+    """
+
+    def __init__(self, max_kinds=100, max_samples=3):
+        self.max_kinds = max_kinds
+        self.max_samples = max_samples
+        # (class name, message) -> [count, exemplars]
+        self.kinds = OrderedDict()
+        self.overflow = 0
+        self.total = 0
+
+    def _kind(self, name, message):
+        key = (name, _OBJECT_ADDRESS.sub('0x...', message)[:_MAX_MESSAGE])
+        if key not in self.kinds and len(self.kinds) >= self.max_kinds:
+            return None
+        return self.kinds.setdefault(key, [0, []])
+
+    def add(self, error):
+        self.total += 1
+        kind = self._kind(error.__class__.__name__, str(error))
+        if kind is None:
+            self.overflow += 1
+            return
+        kind[0] += 1
+        if len(kind[1]) < self.max_samples:
+            if getattr(error, '__traceback__', None) is not None:
+                # the frames hold responses, sockets and the like
+                error.__traceback__ = None
+            kind[1].append(error)
+
+    def merge(self, other):
+        """Adds the errors of *other*."""
+        self.total += other.total
+        self.overflow += other.overflow
+        for (name, message), (count, samples) in other.kinds.items():
+            kind = self._kind(name, message)
+            if kind is None:
+                self.overflow += count
+                continue
+            kind[0] += count
+            kind[1].extend(samples[:self.max_samples - len(kind[1])])
+
+    def summary(self):
+        """Returns the (class name, message, count) of every kind, the
+        most frequent first."""
+        return sorted(((name, message, count) for (name, message),
+                       (count, samples) in self.kinds.items()),
+                      key=lambda kind: -kind[2])
+
+    def to_dict(self):
+        return {'kinds': [[name, message, count,
+                           [str(sample) for sample in samples]]
+                          for (name, message), (count, samples)
+                          in self.kinds.items()],
+                'overflow': self.overflow}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls()
+        for name, message, count, samples in data['kinds']:
+            table.kinds[(name, message)] = [
+                count, [_error(name, sample) for sample in samples]]
+            table.total += count
+        table.overflow = data['overflow']
+        table.total += table.overflow
+        return table
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        for count, samples in self.kinds.values():
+            for sample in samples:
+                yield sample
+
+
+class RunResults(object):
+
+    """Encapsulates the results of a single Boom run.
+
+    Contains a dictionary of status codes to histograms of request
+    durations, an :class:`ErrorTable` of the errors of the run, the
+    total time of the run, the number of calls dropped because they were
+    still running after the drain timeout, the number of new and reused
+    connections, histograms of the duration of every phase of the calls
+    (see :mod:`boom.session`), a histogram of how late calls were sent
+    compared to the schedule of a --rate run, counters of the HTTP/2
+    streams (see :mod:`boom.http2`) and the number of calls done so far.
+
+    Runs following a profile also have the results of every stage in
+    ``stages``, the ones of the running stage being ``stage``. Runs of
+    a scenario have the results of every request of the scenario in
+    ``endpoints``. Runs spreading their connections with a
+    :class:`boom.resolver.Resolver` have the results of every address in
+    ``addresses``, by address. Runs reporting intervals have the results
+    of the running one in ``interval``.
+
+    When *keep_samples* is True, every request duration is also kept in
+    the ``samples`` dictionary of status codes to lists. When ``output``
+    is a :class:`boom.output.ResultWriter`, every call is also streamed
+    to it.
+
+    Results of runs made in parallel can be combined with :meth:`merge`,
+    and shipped between processes with :meth:`to_dict` and
+    :meth:`from_dict`.
+    """
+
+    def __init__(self, num=1, quiet=False, keep_samples=False, label=None):
+        self.label = label
+        self.status_code_counter = defaultdict(Histogram)
+        self.samples = defaultdict(list) if keep_samples else None
+        self.errors = ErrorTable()
+        self.total_time = None
+        self.dropped = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.phases = defaultdict(Histogram)
+        self.schedule_lag = Histogram()
+        self.streams = defaultdict(int)
+        self.stages = []
+        self.stage = None
+        self.endpoints = []
+        self.addresses = OrderedDict()
+        self.interval = None
+        self.output = None
+        self.num = num
+        self.done = 0
+        self.quiet = quiet
+
+    def _address(self, address):
+        if address not in self.addresses:
+            self.addresses[address] = RunResults(None, quiet=True,
+                                                 label=address)
+        return self.addresses[address]
+
+    def record(self, status_code, duration, endpoint=None, address=None):
+        self.status_code_counter[status_code].append(duration)
+        if self.samples is not None:
+            self.samples[status_code].append(duration)
+        if self.stage is not None:
+            self.stage.record(status_code, duration)
+        if self.interval is not None:
+            self.interval.record(status_code, duration)
+        if endpoint is not None:
+            self.endpoints[endpoint].record(status_code, duration)
+        if address is not None:
+            self._address(address).record(status_code, duration)
+
+    def record_error(self, error, endpoint=None, address=None):
+        self.errors.add(error)
+        if self.stage is not None:
+            self.stage.record_error(error)
+        if self.interval is not None:
+            self.interval.record_error(error)
+        if endpoint is not None:
+            self.endpoints[endpoint].record_error(error)
+        if address is not None:
+            self._address(address).record_error(error)
+
+    def merge(self, other):
+        """Adds the results of *other*, a run made in parallel."""
+        for code, histogram in other.status_code_counter.items():
+            self.status_code_counter[code].merge(histogram)
+        if self.samples is not None and other.samples is not None:
+            for code, samples in other.samples.items():
+                self.samples[code].extend(samples)
+        self.errors.merge(other.errors)
+        if other.total_time is not None:
+            self.total_time = max(self.total_time or 0, other.total_time)
+        self.dropped += other.dropped
+        self.new_connections += other.new_connections
+        self.reused_connections += other.reused_connections
+        for phase, histogram in other.phases.items():
+            self.phases[phase].merge(histogram)
+        self.schedule_lag.merge(other.schedule_lag)
+        for name, count in other.streams.items():
+            self.streams[name] += count
+        if not self.stages:
+            self.stages = [RunResults(None, quiet=True, label=stage.label)
+                           for stage in other.stages]
+        for stage, other_stage in zip(self.stages, other.stages):
+            stage.merge(other_stage)
+        if not self.endpoints:
+            self.endpoints = [RunResults(None, quiet=True,
+                                         label=endpoint.label)
+                              for endpoint in other.endpoints]
+        for endpoint, other_endpoint in zip(self.endpoints,
+                                            other.endpoints):
+            endpoint.merge(other_endpoint)
+        for address, other_address in other.addresses.items():
+            self._address(address).merge(other_address)
+        return self
+
+    def to_dict(self):
+        """Returns a JSON serializable summary of the results.
+
+        Durations are shipped as histograms and errors as the counts of
+        their kinds, never as raw samples or exception instances.
+        """
+        return {'label': self.label,
+                'status_code_counter': dict(
+                    (str(code), histogram.to_dict())
+                    for code, histogram in self.status_code_counter.items()),
+                'errors': self.errors.to_dict(),
+                'total_time': self.total_time,
+                'dropped': self.dropped,
+                'new_connections': self.new_connections,
+                'reused_connections': self.reused_connections,
+                'phases': dict((phase, histogram.to_dict())
+                               for phase, histogram in self.phases.items()),
+                'schedule_lag': self.schedule_lag.to_dict(),
+                'streams': dict(self.streams),
+                'stages': [stage.to_dict() for stage in self.stages],
+                'endpoints': [endpoint.to_dict()
+                              for endpoint in self.endpoints],
+                'addresses': [address.to_dict()
+                              for address in self.addresses.values()]}
+
+    @classmethod
+    def from_dict(cls, data, quiet=True):
+        """Builds a RunResults from the output of :meth:`to_dict`."""
+        results = cls(None, quiet, label=data['label'])
+        for code, histogram in data['status_code_counter'].items():
+            code = int(code) if code.isdigit() else code
+            results.status_code_counter[code] = Histogram.from_dict(histogram)
+        results.errors = ErrorTable.from_dict(data['errors'])
+        results.total_time = data['total_time']
+        results.dropped = data['dropped']
+        results.new_connections = data['new_connections']
+        results.reused_connections = data['reused_connections']
+        for phase, histogram in data['phases'].items():
+            results.phases[phase] = Histogram.from_dict(histogram)
+        results.schedule_lag = Histogram.from_dict(data['schedule_lag'])
+        results.streams.update(data['streams'])
+        results.stages = [cls.from_dict(stage) for stage in data['stages']]
+        results.endpoints = [cls.from_dict(endpoint)
+                             for endpoint in data['endpoints']]
+        for address in data['addresses']:
+            address = cls.from_dict(address)
+            results.addresses[address.label] = address
+        return results
+
+    def incr(self):
+        # the progress is drawn by a Progress greenlet, keep this one cheap
+        self.done += 1
+
+
+RunStats = namedtuple(
+    'RunStats', ['count', 'total_time', 'rps', 'avg', 'min',
+                 'max', 'amp', 'stdev', 'dropped', 'errors', 'client_errors',
+                 'new_connections',
+                 'reused_connections', 'percentiles', 'status_codes',
+                 'phases', 'schedule_lag', 'streams', 'stages',
+                 'endpoints', 'addresses'])
+
+
+def _percentiles(histogram, percents):
+    """Returns an ordered mapping of labels like p99 to durations."""
+    values = histogram.percentiles(percents)
+    return OrderedDict(('p%g' % percent, value)
+                       for percent, value in zip(percents, values))
+
+
+def calc_stats(results, percentiles=_PERCENTILES):
+    """Calculate stats (min, max, avg, percentiles) from the given
+       RunResults.
+
+       The statistics are returned as a RunStats object. Percentiles are
+       also given for each status code. ``errors`` has the kinds of
+       errors, the most frequent first, and ``client_errors`` counts the
+       ones due to the client running out of local resources, see
+       :func:`boom.sockets.is_exhaustion`.
+    """
+    all_res = Histogram()
+    status_codes = OrderedDict()
+    for code, values in sorted(results.status_code_counter.items()):
+        all_res.merge(values)
+        status_codes[str(code)] = OrderedDict((
+            ('count', values.count),
+            ('percentiles', _percentiles(values, percentiles))))
+
+    count = all_res.count
+
+    if all_res.sum == 0 or count == 0:
+        rps = avg = min_ = max_ = amp = stdev = 0
+    else:
+        if results.total_time == 0:
+            rps = 0
+        else:
+            rps = count / float(results.total_time)
+        avg = all_res.mean
+        max_ = all_res.max
+        min_ = all_res.min
+        amp = max_ - min_
+        stdev = all_res.stdev
+
+    phases = OrderedDict()
+    for phase in PHASES:
+        values = results.phases.get(phase)
+        if values:
+            phases[phase] = OrderedDict((
+                ('count', values.count), ('avg', values.mean),
+                ('percentiles', _percentiles(values, percentiles))))
+
+    lag = results.schedule_lag
+    if lag.count == 0:
+        schedule_lag = None
+    else:
+        schedule_lag = OrderedDict((('avg', lag.mean),
+                                    ('p99', lag.percentile(99)),
+                                    ('max', lag.max)))
+
+    streams = (OrderedDict(sorted(results.streams.items()))
+               if results.streams else None)
+    errors = [OrderedDict((('type', name), ('message', message),
+                           ('count', count),
+                           ('client', is_exhaustion(message))))
+              for name, message, count in results.errors.summary()]
+    if results.errors.overflow:
+        errors.append(OrderedDict((
+            ('type', None), ('message', 'Errors of other kinds'),
+            ('count', results.errors.overflow), ('client', False))))
+    client_errors = sum(error['count'] for error in errors
+                        if error['client'])
+
+    return (
+        RunStats(count, results.total_time, rps, avg, min_, max_, amp, stdev,
+                 results.dropped, errors, client_errors,
+                 results.new_connections,
+                 results.reused_connections,
+                 _percentiles(all_res, percentiles), status_codes,
+                 phases, schedule_lag, streams,
+                 _summaries(results.stages, percentiles),
+                 _summaries(results.endpoints, percentiles),
+                 _summaries(results.addresses.values(), percentiles))
+    )
+
+
+def _summaries(parts, percentiles):
+    """Returns the summaries of the stages, endpoints or addresses of a
+    run."""
+    summaries = []
+    for part in parts:
+        stats = calc_stats(part, percentiles)
+        summaries.append(OrderedDict((
+            ('label', part.label), ('count', stats.count),
+            ('errors', len(part.errors)), ('rps', stats.rps),
+            ('avg', stats.avg), ('percentiles', stats.percentiles))))
+    return summaries
@@ -0,0 +1,161 @@
+"""Scenarios, weighted mixes of calls.
+
+A scenario file lists the calls of a run, as JSON or, when PyYAML is
+installed, YAML. Every call has a ``url`` and optionally a ``name``, a
+``method`` (GET by default), ``headers``, ``data`` and a ``weight`` (1
+by default)::
+
+    {"requests": [
+        {"name": "home", "url": "/", "weight": 8},
+        {"name": "search", "url": "/search?q=boom", "weight": 2},
+        {"name": "login", "url": "/login", "method": "POST",
+         "data": "user=boom", "weight": 1}
+    ]}
+
+The list can also be given as is, without the ``requests`` key. URLs
+are relative to the URL given on the command line, if any.
+
+Each call of a run picks one of them at random according to the
+weights, in constant time with the alias method.
+"""
+import json
+import random
+from collections import namedtuple
+
+try:
+    import urlparse
+except ImportError:
+    from urllib import parse as urlparse
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+# the strings of a scenario file, unicode ones on Python 2
+_TEXT = (str, type(u''))
+# the methods of the command line
+_METHODS = ('GET', 'POST', 'DELETE', 'PUT', 'HEAD', 'OPTIONS')
+Entry = namedtuple('Entry', ['name', 'url', 'method', 'headers', 'data',
+                             'weight'])
+
+
+class AliasSampler(object):
+    """Picks indexes at random following *weights*, with Vose's alias
+    method: one random number and one lookup per sample."""
+
+    def __init__(self, weights):
+        if not weights or any(weight < 0 for weight in weights):
+            raise ValueError('Weights must be positive numbers')
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError('Weights must be positive numbers')
+
+        size = len(weights)
+        scaled = [weight * size / total for weight in weights]
+        self._size = size
+        self._probability = [1.] * size
+        self._alias = list(range(size))
+        small = [index for index, value in enumerate(scaled) if value < 1]
+        large = [index for index, value in enumerate(scaled) if value >= 1]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # what's left is 1 within rounding errors, kept with probability 1
+
+    def sample(self):
+        value = random.random() * self._size
+        index = int(value)
+        if value - index < self._probability[index]:
+            return index
+        return self._alias[index]
+
+
+class Mix(object):
+    """Picks the templates of a scenario's calls following their
+    weights."""
+
+    def __init__(self, templates, weights):
+        self.templates = templates
+        self.sampler = AliasSampler(weights)
+
+    def pick(self):
+        return self.templates[self.sampler.sample()]
+
+
+class Scenario(object):
+    """A list of :class:`Entry`, with unique names."""
+
+    def __init__(self, entries):
+        if not entries:
+            raise ValueError('A scenario needs at least one request')
+        names = set()
+        for entry in entries:
+            if entry.name in names:
+                raise ValueError('Two requests are named %r' % entry.name)
+            names.add(entry.name)
+            if entry.weight <= 0:
+                raise ValueError('The weight of %r must be positive' %
+                                 entry.name)
+        self.entries = list(entries)
+
+    @classmethod
+    def parse(cls, data, base_url=None):
+        """Builds a scenario from the content of a scenario file."""
+        if isinstance(data, dict):
+            data = data.get('requests')
+        if not isinstance(data, list):
+            raise ValueError('A scenario is a list of requests')
+
+        entries = []
+        for item in data:
+            if not isinstance(item, dict) or \
+                    not isinstance(item.get('url'), _TEXT):
+                raise ValueError('Every request needs an url')
+            url = item['url']
+            if base_url is not None:
+                url = urlparse.urljoin(base_url, url)
+            method = item.get('method', 'GET')
+            if not isinstance(method, _TEXT) or \
+                    method.upper() not in _METHODS:
+                raise ValueError('Unknown method %r for %s' % (method,
+                                                               item['url']))
+            method = method.upper()
+            headers = item.get('headers') or {}
+            if not isinstance(headers, dict) or not all(
+                    isinstance(name, _TEXT) and isinstance(value, _TEXT)
+                    for name, value in headers.items()):
+                raise ValueError('The headers of %s must map names to '
+                                 'strings' % item['url'])
+            body = item.get('data')
+            if body is not None and not isinstance(body, _TEXT):
+                raise ValueError('The data of %s must be a string' %
+                                 item['url'])
+            entries.append(Entry(
+                item.get('name', '%s %s' % (method, item['url'])), url,
+                method, headers, body, float(item.get('weight', 1))))
+
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path, base_url=None):
+        """Reads a scenario file, YAML when its extension says so."""
+        with open(path) as f:
+            if path.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise ValueError('YAML scenarios need PyYAML')
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls.parse(data, base_url)
+
+    def __len__(self):
+        return len(self.entries)
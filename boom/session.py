@@ -0,0 +1,221 @@
+"""Keep-alive HTTP sessions shared by the virtual users of a run.
+
+The module level helpers of Requests (``requests.get`` & co) build a new
+:class:`requests.Session` for every call, which means a new TCP (and TLS)
+handshake per request. Boom instead uses one session per run, backed by
+a connection pool sized to the concurrency, and counts how many requests
+got a fresh connection versus a reused one.
+
+Connections also time the phases of every request, which end up in the
+``phases`` histograms of the RunResults:
+
+- connect: TCP handshake of a new connection,
+- tls: TLS handshake of a new HTTPS connection,
+- ttfb: from the request sent to the response headers received,
+- body: reading the response body.
+
+With a :class:`boom.resolver.Resolver`, every new connection goes to the
+next address of its host, and responses have the ``address`` they came
+from. With a :class:`boom.sockets.SocketOptions`, connections are bound
+to its source addresses and get its socket options.
+"""
+from requests import ConnectionError, Session
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import HTTPError
+from requests.packages.urllib3.connection import (HTTPConnection,
+                                                  HTTPSConnection)
+from requests.packages.urllib3.connectionpool import (HTTPConnectionPool,
+                                                      HTTPSConnectionPool)
+from requests.packages.urllib3.poolmanager import PoolManager
+
+from boom.util import monotonic
+
+
+PHASES = ('connect', 'tls', 'ttfb', 'body')
+
+
+class _TimedConnectionMixin(object):
+    """Connection timing its phases into a RunResults, and connecting to
+    the address given by a Resolver."""
+
+    results = None
+    resolver = None
+    sockets = None
+    address = None
+    _connect_time = 0
+
+    def _record(self, phase, duration):
+        if self.results is not None:
+            self.results.phases[phase].append(duration)
+
+    def _new_conn(self):
+        if self.sockets is not None:
+            self.source_address = self.sockets.source()
+            self.socket_options = self.sockets.options
+        host = self._dns_host
+        if self.resolver is not None:
+            # urllib3 connects to _dns_host, the host name is still used
+            # for the TLS handshake.
+            self.address = self._dns_host = self.resolver.pick(host,
+                                                               self.port)
+        start = monotonic()
+        try:
+            sock = super(_TimedConnectionMixin, self)._new_conn()
+        except HTTPError as exc:
+            exc.address = self.address
+            raise
+        finally:
+            self._dns_host = host
+        self._connect_time = monotonic() - start
+        self._record('connect', self._connect_time)
+        return sock
+
+    def getresponse(self, *args, **kwargs):
+        start = monotonic()
+        response = super(_TimedConnectionMixin, self).getresponse(
+            *args, **kwargs)
+        self._record('ttfb', monotonic() - start)
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        start = monotonic()
+        super(TimedHTTPSConnection, self).connect()
+        # connect() opens the socket with _new_conn() then does the TLS
+        # handshake.
+        self._record('tls', monotonic() - start - self._connect_time)
+
+
+class _CountingPoolMixin(object):
+    """Connection pool which reports connection reuse to a RunResults, and
+    gives it, its Resolver and its SocketOptions to its connections."""
+
+    results = None
+    resolver = None
+    sockets = None
+
+    def _new_conn(self):
+        conn = super(_CountingPoolMixin, self)._new_conn()
+        conn.results = self.results
+        conn.resolver = self.resolver
+        conn.sockets = self.sockets
+        return conn
+
+    def _get_conn(self, timeout=None):
+        conn = super(_CountingPoolMixin, self)._get_conn(timeout=timeout)
+
+        if self.results is not None:
+            # a connection without socket will connect on its next request,
+            # either because it's brand new or because it was dropped.
+            if getattr(conn, 'sock', None) is None:
+                self.results.new_connections += 1
+            else:
+                self.results.reused_connections += 1
+
+        return conn
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class CountingPoolManager(PoolManager):
+    """PoolManager creating connection pools bound to a RunResults, a
+    Resolver and SocketOptions."""
+
+    def __init__(self, results, *args, **kwargs):
+        self.resolver = kwargs.pop('resolver', None)
+        self.sockets = kwargs.pop('sockets', None)
+        super(CountingPoolManager, self).__init__(*args, **kwargs)
+        self.results = results
+        self.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool}
+
+    def _new_pool(self, *args, **kwargs):
+        pool = super(CountingPoolManager, self)._new_pool(*args, **kwargs)
+        pool.results = self.results
+        pool.resolver = self.resolver
+        pool.sockets = self.sockets
+        return pool
+
+
+class BoomAdapter(HTTPAdapter):
+    """HTTPAdapter using a :class:`CountingPoolManager`, and timing the
+    read of the response bodies."""
+
+    def __init__(self, results=None, resolver=None, sockets=None,
+                 **kwargs):
+        self.results = results
+        self.resolver = resolver
+        self.sockets = sockets
+        super(BoomAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = CountingPoolManager(
+            self.results, num_pools=connections, maxsize=maxsize,
+            block=block, resolver=self.resolver, sockets=self.sockets,
+            **pool_kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        try:
+            response = super(BoomAdapter, self).send(request, stream=stream,
+                                                     **kwargs)
+        except ConnectionError as exc:
+            # the urllib3 error is the reason of a MaxRetryError
+            reason = getattr(exc.args[0] if exc.args else None, 'reason',
+                             None)
+            exc.address = getattr(reason, 'address', None)
+            raise
+        conn = response.raw.connection
+        response.address = getattr(conn, 'address', None)
+
+        if not stream:
+            # the session would read the body right after anyway
+            start = monotonic()
+            response.content
+            if self.results is not None:
+                self.results.phases['body'].append(monotonic() - start)
+            if conn is not None and \
+                    request.headers.get('Connection') == 'close':
+                # the server closes it, the pool must not reuse it. The
+                # connection may already be back in the pool.
+                conn.close()
+
+        return response
+
+
+def get_session(results=None, concurrency=1, keepalive=True,
+                resolver=None, sockets=None):
+    """Returns a :class:`requests.Session` for a run.
+
+    The connection pool keeps up to *concurrency* connections per host so
+    every virtual user can hold its own socket. When *keepalive* is False,
+    a ``Connection: close`` header is sent so that every request opens a
+    new connection. A *resolver* spreads the connections over the
+    addresses of the hosts, and *sockets* sets them up.
+    """
+    session = Session()
+    adapter = BoomAdapter(results, resolver, sockets,
+                          pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if not keepalive:
+        session.headers['Connection'] = 'close'
+
+    return session
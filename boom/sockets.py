@@ -0,0 +1,97 @@
+"""Options of the sockets of a run, and client resource exhaustion.
+
+Without keep-alive, every call uses a new local port of the client, kept
+in TIME_WAIT for a minute or so once closed. A high concurrency against
+a single host and port runs out of them, and new connections fail with
+``EADDRNOTAVAIL``. :class:`SocketOptions` fights it by spreading the
+connections over several local addresses, each with its own ports, and
+by closing them with a reset (``SO_LINGER`` of 0) which skips TIME_WAIT.
+
+Errors caused by the client running out of ports, file descriptors or
+buffers are told apart from the ones of the server by
+:func:`is_exhaustion`, and reported separately.
+"""
+import errno
+import socket
+import struct
+from itertools import cycle
+
+from requests.packages.urllib3.util.connection import create_connection
+
+
+# errors of a client running out of local ports, descriptors or buffers
+EXHAUSTION_ERRNOS = tuple(getattr(errno, name) for name in (
+    'EADDRNOTAVAIL', 'EADDRINUSE', 'EMFILE', 'ENFILE', 'ENOBUFS')
+    if hasattr(errno, name))
+
+
+class SocketOptions(object):
+    """Sets up the sockets of a run.
+
+    New connections are bound to the *source_addresses* in turn. The
+    sockets get ``SO_REUSEADDR`` when *reuseaddr* is True, a
+    ``SO_LINGER`` of *linger* seconds when it's not None, and
+    ``TCP_NODELAY`` when *nodelay* is True.
+    """
+
+    def __init__(self, source_addresses=None, reuseaddr=False, linger=None,
+                 nodelay=True):
+        self.source_addresses = list(source_addresses or [])
+        self.reuseaddr = reuseaddr
+        self.linger = linger
+        self.nodelay = nodelay
+        self._sources = (cycle(self.source_addresses)
+                         if self.source_addresses else None)
+
+    @property
+    def options(self):
+        """The (level, option, value) to set on every socket."""
+        options = []
+        if self.nodelay:
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        if self.reuseaddr:
+            options.append((socket.SOL_SOCKET, socket.SO_REUSEADDR, 1))
+        if self.linger is not None:
+            options.append((socket.SOL_SOCKET, socket.SO_LINGER,
+                            struct.pack('ii', 1, self.linger)))
+        return options
+
+    def source(self):
+        """Returns the (address, port) the next connection is bound to,
+        or None."""
+        if self._sources is None:
+            return None
+        return next(self._sources), 0
+
+    def check(self):
+        """Raises a :class:`socket.error` when one of the source addresses
+        can't be bound to."""
+        for address in self.source_addresses:
+            family = socket.AF_INET6 if ':' in address else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.bind((address, 0))
+            finally:
+                sock.close()
+
+    def connect(self, address, timeout=None):
+        """Returns a socket connected to *address*, set up before it's
+        bound and connected."""
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        return create_connection(address, timeout,
+                                 source_address=self.source(),
+                                 socket_options=self.options)
+
+
+def is_exhaustion(error):
+    """Tells whether *error* comes from the client running out of local
+    resources rather than from the server.
+
+    Errors rebuilt from the summary of a run only have their message,
+    which has the ``[Errno N]`` of the socket error.
+    """
+    if getattr(error, 'errno', None) in EXHAUSTION_ERRNOS:
+        return True
+    message = str(error)
+    return any('[Errno %d]' % code in message for code in EXHAUSTION_ERRNOS)
@@ -0,0 +1,74 @@
+import subprocess
+import sys
+import unittest
+
+import gevent
+from gevent.pywsgi import WSGIServer
+
+from boom.api import LoadTest
+from boom.tests.test_boom import App
+
+
+class LoadTestTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = App()
+        cls.server = WSGIServer(('127.0.0.1', 0), cls.app.handle, log=None)
+        cls.server.start()
+        cls.url = 'http://127.0.0.1:%d/' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.app.numcalls = 0
+
+    def test_run(self):
+        test = LoadTest(self.url, num=20, concurrency=2)
+        self.assertRaises(RuntimeError, test.results)
+        self.assertTrue(test.start() is test)
+        self.assertRaises(RuntimeError, test.start)
+
+        results = test.results()
+        self.assertFalse(test.running)
+        self.assertEqual(len(results.status_code_counter[200]), 20)
+        self.assertEqual(test.stats().count, 20)
+        self.assertEqual(list(test), [])
+
+    def test_intervals(self):
+        reported = []
+        test = LoadTest(self.url, duration=.5, concurrency=2, interval=.2,
+                        on_interval=lambda results, elapsed:
+                        reported.append(elapsed))
+        intervals = list(test.start())
+        self.assertEqual(len(intervals), 3)
+        self.assertEqual([elapsed for elapsed, results in intervals],
+                         reported)
+        self.assertEqual(sum(len(results.status_code_counter[200])
+                             for elapsed, results in intervals),
+                         len(test.results().status_code_counter[200]))
+
+    def test_stop(self):
+        with LoadTest(self.url, duration=60, interval=.1) as test:
+            for elapsed, results in test:
+                break
+        self.assertFalse(test.running)
+        results = test.results()
+        self.assertTrue(results.total_time < 60)
+        # the call in flight is dropped, no other one is sent
+        calls = self.app.numcalls
+        self.assertTrue(calls - len(results.status_code_counter[200]) <= 1)
+        gevent.sleep(.2)
+        self.assertEqual(self.app.numcalls, calls)
+
+        test = LoadTest(self.url, duration=60).start()
+        self.assertEqual(test.stop(), None)
+
+    def test_no_patching(self):
+        # importing boom doesn't patch the standard library for gevent
+        code = ('import boom.api, gevent.monkey; '
+                'print(gevent.monkey.is_module_patched("socket"))')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip(), b'False')
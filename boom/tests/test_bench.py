@@ -0,0 +1,31 @@
+import unittest
+
+from boom.bench import SERVERS, _Terminal, bench
+from boom.boom import _PROGRESS_REFRESH, Progress
+from boom.results import RunResults
+
+
+class BenchTestCase(unittest.TestCase):
+
+    def test_bench(self):
+        done = []
+        cases = bench(20, engines=('socket', 'urllib3'),
+                      concurrencies=(1, 5), callback=done.append)
+        self.assertEqual(len(cases), len(SERVERS) * 2 * 2 * 2 * 2)
+        self.assertEqual(done, cases)
+
+        for case in cases:
+            self.assertEqual(case['requests'], 20)
+            self.assertEqual(case['errors'], 0)
+            self.assertTrue(case['rps'] > 0)
+            self.assertTrue(case['cpu_per_request'] >= 0)
+
+    def test_terminal(self):
+        # the progress cases pay for the redraws of a terminal
+        stdout = _Terminal()
+        try:
+            progress = Progress(RunResults(), 0, stdout=stdout)
+            self.assertEqual(progress.refresh, _PROGRESS_REFRESH)
+            progress.draw()
+        finally:
+            stdout.close()
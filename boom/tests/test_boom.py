@@ -1,7 +1,11 @@
 import unittest2 as unittest
+import os
+import random
+import shutil
 import subprocess
 import sys
 import shlex
+import tempfile
 try:
     from StringIO import StringIO
 except ImportError:
@@ -12,9 +16,16 @@ from gevent.pywsgi import WSGIServer
 import requests
 import gevent
 
-from boom.boom import (run as runboom, main,
+from boom.boom import (run as runboom, run_processes, main,
                        resolve, RunResults, RequestException)
 from boom import boom
+from boom.engines import Template, get_engine
+from boom.output import read
+from boom.payload import PayloadPool
+from boom.profile import Profile
+from boom.replay import Request
+from boom.resolver import Resolver
+from boom.scenario import Scenario
 
 
 if sys.version_info[0] < 3:
@@ -42,6 +53,9 @@ class App(object):
                 return [str(self.numcalls).encode('latin-1')]
             else:
                 return [str(self.numcalls)]
+        elif env['PATH_INFO'] == '/echo':
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [env['wsgi.input'].read()]
         elif env['PATH_INFO'] == '/redir':
             self.numcalls += 1
             start_response('302 Found', [('Location', '/redir')])
@@ -90,10 +104,29 @@ def pre_hook(method, url, options):
     return method, url, options
 
 
+_DATA_CALLS = []
+
+
+def make_data(method, url, options):
+    _DATA_CALLS.append(method)
+    return 'call %d' % len(_DATA_CALLS)
+
+
+def random_data(method, url, options):
+    # the random draws of every process, see test_processes_random
+    with open(os.environ['BOOM_TEST_DRAWS'], 'a') as f:
+        f.write('%d %r\n' % (os.getpid(), random.random()))
+    return 'data'
+
+
 def post_hook(response):
     return response
 
 
+def post_hook_crashes(response):
+    raise ValueError('crash')
+
+
 def post_hook_fails(data):
     if 'pattern' not in data:
         raise RequestException('missing pattern')
@@ -128,18 +161,284 @@ class TestBoom(unittest.TestCase):
         res = self.get('/calls').content
         self.assertEqual(int(res), 10)
 
+    def test_concurrency(self):
+        for concurrency in (3, 20):
+            self.get('/reset')
+            run_results = runboom(self.server, num=10,
+                                  concurrency=concurrency, quiet=True)
+            res = self.get('/calls').content
+            self.assertEqual(int(res), 10)
+            self.assertEqual(len(run_results.status_code_counter[200]), 10)
+
+    def test_duration(self):
+        run_results = runboom(self.server, num=None, duration=1,
+                              concurrency=5, quiet=True)
+        res = self.get('/calls').content
+        calls = len(run_results.status_code_counter[200])
+        self.assertTrue(calls > 0)
+        self.assertEqual(int(res), calls)
+        self.assertEqual(run_results.dropped, 0)
+        self.assertAlmostEqual(run_results.total_time, 1, delta=0.5)
+
+    def test_rate(self):
+        run_results = runboom(self.server, num=10, concurrency=5, rate=20,
+                              quiet=True)
+        res = self.get('/calls').content
+        self.assertEqual(int(res), 10)
+        self.assertEqual(len(run_results.status_code_counter[200]), 10)
+        self.assertEqual(len(run_results.schedule_lag), 10)
+        # the last call is meant to be sent after 9 / 20 seconds
+        self.assertTrue(run_results.total_time >= 0.45)
+        self.assertTrue(run_results.total_time < 1)
+
+    def test_rate_duration(self):
+        run_results = runboom(self.server, num=None, duration=1,
+                              concurrency=5, rate=20, arrival='poisson',
+                              quiet=True)
+        calls = len(run_results.status_code_counter[200])
+        self.assertEqual(len(run_results.schedule_lag), calls)
+        self.assertTrue(5 < calls < 40, calls)
+
+    def test_profile(self):
+        run_results = runboom(self.server, concurrency=1, quiet=True,
+                              profile=Profile.parse('1-4:0.5,2:0.5'))
+        res = self.get('/calls').content
+        calls = len(run_results.status_code_counter[200])
+        self.assertEqual(int(res), calls)
+        self.assertEqual([stage.label for stage in run_results.stages],
+                         ['1-4:0.5', '2:0.5'])
+        self.assertEqual(sum(len(stage.status_code_counter[200])
+                             for stage in run_results.stages), calls)
+        stats = boom.calc_stats(run_results)
+        self.assertEqual([stage['label'] for stage in stats.stages],
+                         ['1-4:0.5', '2:0.5'])
+
+    def test_rate_profile(self):
+        run_results = runboom(self.server, concurrency=5, quiet=True,
+                              rate=1, profile=Profile.parse('10:0.5,40:0.5'))
+        first, second = [len(stage.status_code_counter[200])
+                         for stage in run_results.stages]
+        self.assertTrue(3 <= first <= 7, first)
+        self.assertTrue(15 <= second <= 25, second)
+
+    def test_report_interval(self):
+        intervals = []
+
+        def on_interval(results, elapsed):
+            intervals.append((elapsed, results))
+
+        run_results = runboom(self.server, num=None, duration=1,
+                              concurrency=2, quiet=True, report_interval=.3,
+                              on_interval=on_interval)
+        self.assertEqual(len(intervals), 4)
+        self.assertAlmostEqual(intervals[0][0], .3, delta=.1)
+        self.assertEqual(sum(len(results.status_code_counter[200])
+                             for elapsed, results in intervals),
+                         len(run_results.status_code_counter[200]))
+        self.assertEqual(run_results.interval, None)
+
+    def test_print_interval(self):
+        results = RunResults()
+        results.record(200, .1)
+        results.record(503, .2)
+        results.record_error(RequestException('boom'))
+        results.total_time = 2
+
+        old_stdout = sys.stdout
+        try:
+            sys.stdout = StringIO()
+            boom.print_interval(results, 10, json_output=True)
+            boom.print_interval(results, 10)
+            output = sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = old_stdout
+
+        actual = json.loads(output[0])
+        self.assertEqual(actual['count'], 2)
+        self.assertEqual(actual['errors'], 1)
+        self.assertEqual(actual['status_codes'], {'200': 1, '503': 1})
+        self.assertTrue(output[1].startswith('[   10.0s] 2 calls, 1 RPS, '
+                                             '1 errors, 200: 1, 503: 1, '),
+                        output[1])
+
+    def test_processes(self):
+        run_results = run_processes(2, self.server, num=11, concurrency=4)
+        res = self.get('/calls').content
+        self.assertEqual(int(res), 11)
+        self.assertEqual(len(run_results.status_code_counter[200]), 11)
+        self.assertEqual(run_results.new_connections, 4)
+        self.assertTrue(run_results.total_time > 0)
+
+    def test_processes_profile(self):
+        # every process runs whole workers, the stages keep their labels
+        run_results = run_processes(2, self.server, concurrency=3,
+                                    profile=Profile.parse('3:0.5,1:1'))
+        self.assertEqual([stage.label for stage in run_results.stages],
+                         ['3:0.5', '1:1'])
+        self.assertTrue(len(run_results.stages[1].status_code_counter[200])
+                        > 10)
+
+    def test_processes_intervals(self):
+        self.assertRaises(ValueError, run_processes, 2, self.server, num=4,
+                          concurrency=2, report_interval=1)
+        code, stdout, stderr = self._run(self.server, '-n', '4', '-c', '2',
+                                         '--processes', '2',
+                                         '--report-interval', '1')
+        self.assertEqual(code, 0)
+        self.assertTrue('--report-interval does not support --processes'
+                        in stdout, stdout)
+
+    def test_processes_random(self):
+        directory = tempfile.mkdtemp()
+        os.environ['BOOM_TEST_DRAWS'] = os.path.join(directory, 'draws')
+        try:
+            run_processes(2, self.server, num=6, concurrency=2,
+                          method='POST',
+                          data='py:boom.tests.test_boom.random_data')
+            draws = {}
+            with open(os.environ['BOOM_TEST_DRAWS']) as f:
+                for line in f:
+                    pid, value = line.split()
+                    draws.setdefault(pid, []).append(value)
+        finally:
+            del os.environ['BOOM_TEST_DRAWS']
+            shutil.rmtree(directory)
+        first, second = draws.values()
+        self.assertNotEqual(first, second)
+
+    def test_processes_errors(self):
+        run_results = run_processes(3, 'http://localhost:9999', num=6,
+                                    concurrency=3)
+        self.assertEqual(len(run_results.errors), 6)
+        for error in run_results.errors:
+            self.assertIsInstance(error, requests.ConnectionError)
+
+    def test_processes_failure(self):
+        with self.assertRaises(boom.ProcessError) as context:
+            run_processes(2, self.server, num=4, concurrency=2,
+                          output_file='/nonexistent/calls')
+        self.assertIn('process 0 failed', str(context.exception))
+        self.assertIn('process 1 failed', str(context.exception))
+
+    def test_results_merge(self):
+        first, second = RunResults(), RunResults()
+        first.record(200, 0.1)
+        first.total_time = 2
+        second.record(200, 0.3)
+        second.record(404, 0.2)
+        second.record_error(requests.Timeout('slow'))
+        second.total_time = 3
+        second.new_connections = 2
+
+        shipped = RunResults.from_dict(json.loads(json.dumps(
+            second.to_dict())))
+        first.merge(shipped)
+        self.assertEqual(len(first.status_code_counter[200]), 2)
+        self.assertAlmostEqual(first.status_code_counter[200].mean, 0.2)
+        self.assertEqual(len(first.status_code_counter[404]), 1)
+        self.assertEqual(first.total_time, 3)
+        self.assertEqual(first.new_connections, 2)
+        self.assertEqual(len(first.errors), 1)
+        error, = first.errors
+        self.assertIsInstance(error, requests.Timeout)
+        self.assertEqual(str(error), 'slow')
+
+    def test_error_table(self):
+        res = RunResults()
+        for index in range(1000):
+            res.record_error(requests.ConnectionError(
+                'Failed <connection object at %s>' % hex(id(object()) +
+                                                         index)))
+        res.record_error(requests.Timeout('slow'))
+        self.assertEqual(len(res.errors), 1001)
+        self.assertEqual(len(list(res.errors)), 4)
+        self.assertEqual(res.errors.summary(), [
+            ('ConnectionError', 'Failed <connection object at 0x...>', 1000),
+            ('Timeout', 'slow', 1)])
+
+        shipped = RunResults.from_dict(json.loads(json.dumps(
+            res.to_dict())))
+        merged = RunResults().merge(res).merge(shipped)
+        self.assertEqual(len(merged.errors), 2002)
+        # 3 exemplars of the first kind, 2 of the second
+        self.assertEqual(len(list(merged.errors)), 5)
+        stats = boom.calc_stats(merged)
+        self.assertEqual([(error['type'], error['count'])
+                          for error in stats.errors],
+                         [('ConnectionError', 2000), ('Timeout', 2)])
+
+        res.errors.max_kinds = 2
+        res.record_error(requests.Timeout('slower'))
+        self.assertEqual(res.errors.overflow, 1)
+        self.assertEqual(len(res.errors), 1002)
+        self.assertEqual(boom.calc_stats(res).errors[-1]['count'], 1)
+
     def test_pre_hook(self):
         runboom(self.server, method='POST', num=10, concurrency=1,
                 pre_hook='boom.tests.test_boom.pre_hook', quiet=True)
         res = self.get('/calls').content
         self.assertEqual(int(res), 10)
 
+    def test_data_callable(self):
+        del _DATA_CALLS[:]
+        run_results = runboom(self.server, num=5, method='POST',
+                              data='py:boom.tests.test_boom.make_data',
+                              quiet=True)
+        self.assertEqual(len(run_results.status_code_counter[200]), 5)
+        self.assertEqual(len(_DATA_CALLS), 5)
+
+    def test_payloads(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = []
+            for index, content in enumerate((b'first', b'x' * 100000)):
+                paths.append(os.path.join(tmpdir, str(index)))
+                with open(paths[-1], 'wb') as f:
+                    f.write(content)
+            pool = PayloadPool(paths)
+
+            for name in ('requests', 'urllib3', 'socket'):
+                engine = get_engine(name)
+                try:
+                    for content in (b'first', b'x' * 100000):
+                        response = engine.request(
+                            'POST', self.server + '/echo', data=pool())
+                        self.assertEqual(response.content, content)
+                finally:
+                    engine.close()
+
+            run_results = runboom(self.server + '/echo', num=4,
+                                  method='POST', data=pool, quiet=True,
+                                  engine='socket')
+            self.assertEqual(len(run_results.status_code_counter[200]), 4)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_template(self):
+        engine = get_engine('socket')
+        template = Template(engine, 'GET', self.server + '/',
+                            {'headers': {'X-Test': '1'}})
+        self.assertFalse(template.dynamic)
+        method, target, raw = template.prepared
+        self.assertTrue(raw.startswith(b'GET / HTTP/1.1\r\n'), raw)
+        self.assertTrue(b'X-Test: 1\r\n' in raw, raw)
+        self.assertEqual(engine.send(template.prepared).status_code, 200)
+
+        template = Template(engine, 'POST', self.server + '/',
+                            {'data': make_data})
+        self.assertTrue(template.dynamic)
+        self.assertEqual(template.prepared, None)
+        method, url, options = template.build()
+        self.assertTrue(options['data'].startswith('call '))
+        self.assertEqual(method(url, **options).status_code, 200)
+        engine.close()
+
     def test_post_hook(self):
         run_results = runboom(
             self.server, method='GET', num=10, concurrency=1,
             post_hook='boom.tests.test_boom.post_hook', quiet=True)
         res = self.get('/calls').content
-        self.assertEqual(run_results.errors, [])
+        self.assertEqual(len(run_results.errors), 0)
         self.assertEqual(int(res), 10)
 
     def test_post_hook_fails(self):
@@ -155,6 +454,20 @@ class TestBoom(unittest.TestCase):
 
         self.assertEqual(int(res), 10)
 
+    def test_post_hook_crashes(self):
+        hook = 'boom.tests.test_boom.post_hook_crashes'
+        run_results = runboom(self.server, num=10, concurrency=1,
+                              post_hook=hook, quiet=True)
+        self.assertEqual(int(self.get('/calls').content), 10)
+        self.assertEqual(len(run_results.errors), 10)
+        self.assertEqual(run_results.errors.summary(),
+                         [('ValueError', 'crash', 10)])
+
+        run_results = runboom(self.server, num=None, duration=1,
+                              concurrency=2, post_hook=hook, quiet=True)
+        self.assertGreaterEqual(run_results.total_time, 1)
+        self.assertGreater(len(run_results.errors), 2)
+
     def test_connection_error(self):
         run_results = runboom(
             'http://localhost:9999', num=10, concurrency=1,
@@ -172,6 +485,231 @@ class TestBoom(unittest.TestCase):
         for error in run_results.errors:
             self.assertIsInstance(error, requests.TooManyRedirects)
 
+    def test_keepalive(self):
+        run_results = runboom(self.server, num=10, concurrency=1, quiet=True)
+        self.assertEqual(run_results.new_connections, 1)
+        self.assertEqual(run_results.reused_connections, 9)
+
+    def test_phases(self):
+        run_results = runboom(self.server, num=10, concurrency=2, quiet=True)
+        phases = run_results.phases
+        self.assertEqual(phases['connect'].count,
+                         run_results.new_connections)
+        self.assertEqual(phases['ttfb'].count, 10)
+        self.assertEqual(phases['body'].count, 10)
+        self.assertFalse('tls' in phases)
+
+        stats = boom.calc_stats(run_results, [50])
+        self.assertEqual(list(stats.phases), ['connect', 'ttfb', 'body'])
+        self.assertEqual(stats.phases['ttfb']['count'], 10)
+
+        merged = RunResults.from_dict(run_results.to_dict())
+        merged.merge(run_results)
+        self.assertEqual(merged.phases['body'].count, 20)
+
+    def test_output_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'results.jsonl')
+        try:
+            runboom(self.server, num=10, concurrency=2, quiet=True,
+                    output_file=path, output_format='jsonl')
+            records = list(read(path, 'jsonl'))
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+
+        self.assertEqual(len(records), 10)
+        self.assertEqual(set(record.status for record in records), set([200]))
+        self.assertEqual(set(record.worker for record in records),
+                         set([0, 1]))
+        self.assertTrue(all(record.bytes > 0 for record in records))
+
+    def test_invalid_output_file(self):
+        code, stdout, stderr = self._run(self.server, '--output-file',
+                                         '/nonexistent/calls')
+        self.assertEqual(code, 0)
+        self.assertTrue('Can not write the output file /nonexistent/calls'
+                        in stdout, stdout)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'calls')
+        try:
+            os.mkdir(path + '.1')
+            code, stdout, stderr = self._run(self.server, '-c', '2',
+                                             '--processes', '2',
+                                             '--output-file', path)
+            self.assertTrue('Can not write the output file %s.1' % path
+                            in stdout, stdout)
+            # nothing is written before the options are all checked
+            code, stdout, stderr = self._run(self.server, '--output-file',
+                                             path, '--percentiles', '0')
+            self.assertEqual(os.listdir(directory), ['calls.1'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_engines(self):
+        for engine in ('urllib3', 'socket'):
+            run_results = runboom(self.server, num=10, concurrency=2,
+                                  quiet=True, engine=engine)
+            self.assertEqual(len(run_results.status_code_counter[200]), 10)
+            self.assertEqual(len(run_results.errors), 0)
+            self.assertEqual(run_results.new_connections +
+                             run_results.reused_connections, 10)
+            self.assertLessEqual(run_results.new_connections, 2)
+            self.assertEqual(run_results.phases['ttfb'].count, 10)
+
+            run_results = runboom(self.server + '/missing', method='POST',
+                                  data='data', quiet=True, engine=engine,
+                                  auth='user:password')
+            self.assertEqual(len(run_results.status_code_counter[404]), 1)
+
+    def test_engine_errors(self):
+        for engine in ('urllib3', 'socket'):
+            run_results = runboom('http://127.0.0.1:1/', num=2, quiet=True,
+                                  engine=engine)
+            self.assertEqual(len(run_results.errors), 2)
+            for error in run_results.errors:
+                self.assertIsInstance(error, RequestException)
+
+    @unittest.skipIf(not PY3, 'asyncio needs Python 3')
+    def test_asyncio(self):
+        from boom import aio
+        run_results = aio.run(self.server, num=10, concurrency=2)
+        self.assertTrue(isinstance(run_results, RunResults))
+        self.assertEqual(len(run_results.status_code_counter[200]), 10)
+        self.assertEqual(run_results.new_connections, 2)
+        self.assertEqual(run_results.reused_connections, 8)
+
+        run_results = aio.run(self.server, num=None, duration=1, rate=20)
+        self.assertAlmostEqual(len(run_results.status_code_counter[200]),
+                               20, delta=1)
+        self.assertEqual(run_results.schedule_lag.count,
+                         run_results.done)
+
+        loop = aio.new_event_loop()
+        try:
+            run_results = loop.run_until_complete(
+                aio.arun(self.server + '/missing', method='POST',
+                         data='data', auth='user:password'))
+        finally:
+            loop.close()
+        self.assertEqual(len(run_results.status_code_counter[404]), 1)
+
+        run_results = aio.run('http://127.0.0.1:1/', num=2)
+        self.assertEqual(len(run_results.errors), 2)
+        self.assertEqual(boom.calc_stats(run_results).count, 0)
+
+        # the workers go on when a hook raises
+        run_results = aio.run(self.server, num=20, concurrency=2,
+                              post_hook='boom.tests.test_boom.'
+                                        'post_hook_crashes')
+        self.assertEqual(run_results.done, 20)
+        self.assertEqual(len(run_results.errors), 20)
+
+        self.assertRaises(ValueError, aio.run, self.server, num=None)
+
+    def test_scenario(self):
+        scenario = Scenario.parse([
+            {'name': 'home', 'url': '/', 'weight': 3},
+            {'name': 'missing', 'url': '/missing', 'method': 'POST',
+             'data': 'data'}], self.server)
+        run_results = runboom(None, num=40, concurrency=2, quiet=True,
+                              scenario=scenario)
+        home, missing = run_results.endpoints
+        self.assertEqual(home.label, 'home')
+        self.assertEqual(list(home.status_code_counter), [200])
+        self.assertEqual(list(missing.status_code_counter), [404])
+        self.assertEqual(len(home.status_code_counter[200]) +
+                         len(missing.status_code_counter[404]), 40)
+        self.assertLessEqual(run_results.new_connections, 2)
+
+        stats = boom.calc_stats(run_results)
+        self.assertEqual([endpoint['label'] for endpoint in stats.endpoints],
+                         ['home', 'missing'])
+        self.assertEqual(sum(endpoint['count']
+                             for endpoint in stats.endpoints), 40)
+
+        merged = RunResults.from_dict(run_results.to_dict())
+        merged.merge(run_results)
+        self.assertEqual(len(merged.endpoints[1].status_code_counter[404]),
+                         2 * len(missing.status_code_counter[404]))
+
+    def test_resolver(self):
+        addresses = ['127.0.0.1', '127.0.0.2']
+        for engine in ('requests', 'urllib3', 'socket'):
+            resolver = Resolver({('localhost', 8089): addresses})
+            run_results = runboom('http://localhost:8089/', num=20,
+                                  concurrency=2, quiet=True, engine=engine,
+                                  keepalive=False, resolver=resolver)
+            self.assertEqual(sorted(run_results.addresses), addresses)
+            for address in run_results.addresses.values():
+                self.assertEqual(len(address.status_code_counter[200]), 10)
+
+            stats = boom.calc_stats(run_results)
+            self.assertEqual(sorted(address['label']
+                                    for address in stats.addresses),
+                             addresses)
+
+            merged = RunResults.from_dict(run_results.to_dict())
+            merged.merge(run_results)
+            self.assertEqual(
+                len(merged.addresses['127.0.0.2'].status_code_counter[200]),
+                20)
+
+            resolver = Resolver({('localhost', 1): ['127.0.0.3']})
+            run_results = runboom('http://localhost:1/', quiet=True,
+                                  engine=engine, resolver=resolver)
+            self.assertEqual(len(run_results.errors), 1)
+            self.assertEqual(list(run_results.addresses), ['127.0.0.3'])
+
+    @unittest.skipIf(not PY3, 'asyncio needs Python 3')
+    def test_asyncio_resolver(self):
+        from boom import aio
+        resolver = Resolver({('localhost', 8089): ['127.0.0.1',
+                                                   '127.0.0.2']})
+        run_results = aio.run('http://localhost:8089/', num=10,
+                              concurrency=2, resolver=resolver)
+        self.assertEqual(sorted(run_results.addresses),
+                         ['127.0.0.1', '127.0.0.2'])
+
+    def test_replay(self):
+        log = [Request(100, 'GET', '/'), Request(100, 'GET', '/missing'),
+               Request(101, 'POST', '/')]
+
+        run_results = runboom(self.server + '/', num=None, quiet=True,
+                              concurrency=2, replay=iter(log),
+                              replay_speed=4)
+        self.assertEqual(len(run_results.status_code_counter[200]), 2)
+        self.assertEqual(len(run_results.status_code_counter[404]), 1)
+        self.assertEqual(run_results.schedule_lag.count, 3)
+        self.assertGreaterEqual(run_results.total_time, .25)
+
+        run_results = runboom(self.server + '/', num=2, quiet=True,
+                              replay=iter(log))
+        self.assertEqual(run_results.schedule_lag.count, 0)
+        self.assertEqual(run_results.done, 2)
+
+    def test_missing_replay(self):
+        code, stdout, stderr = self._run(self.server, '--replay',
+                                         '/nonexistent/access.log')
+        self.assertEqual(code, 0)
+        self.assertTrue('Invalid log /nonexistent/access.log' in stdout,
+                        stdout)
+
+    def test_keep_samples(self):
+        run_results = runboom(self.server, num=10, concurrency=1, quiet=True)
+        self.assertEqual(run_results.samples, None)
+        self.assertEqual(len(run_results.status_code_counter[200]), 10)
+
+        run_results = runboom(self.server, num=10, concurrency=1, quiet=True,
+                              keep_samples=True)
+        self.assertEqual(len(run_results.samples[200]), 10)
+
+    def test_no_keepalive(self):
+        for engine in ('requests', 'urllib3', 'socket'):
+            run_results = runboom(self.server, num=10, concurrency=1,
+                                  quiet=True, keepalive=False, engine=engine)
+            self.assertEqual(run_results.new_connections, 10)
+            self.assertEqual(run_results.reused_connections, 0)
+
     def _run(self, *args):
         sys.argv[:] = [sys.executable] + list(args)
         old_stdout = sys.stdout
@@ -196,6 +734,25 @@ class TestBoom(unittest.TestCase):
 
         return exit_code, stdout, stderr
 
+    def test_asyncio_no_patching(self):
+        # the asyncio engine runs on the standard library
+        code = ('import sys, gevent.monkey\n'
+                'from boom.boom import main\n'
+                'sys.argv[1:] = ["--quiet", "--engine", "asyncio", %r]\n'
+                'main()\n'
+                'print(gevent.monkey.is_module_patched("socket"))'
+                % self.server)
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(output.strip().splitlines()[-1], b'False')
+
+    def test_percentiles_output(self):
+        code, stdout, stderr = self._run(self.server, '-n', '10',
+                                         '--percentiles', '50,99.9')
+        self.assertEqual(code, 0)
+        self.assertTrue('p50' in stdout, stdout)
+        self.assertTrue('p99.9' in stdout, stdout)
+        self.assertTrue('p90' not in stdout, stdout)
+
     def test_dns_resolve(self):
         code, stdout, stderr = self._run('http://that.impossiblename')
         self.assertEqual(code, 1)
@@ -229,6 +786,29 @@ class TestBoom(unittest.TestCase):
         self.assertEqual(original, 'localhost')
         self.assertEqual(resolved, 'localhost')
 
+    def test_progress(self):
+        results = RunResults(num=10)
+        stdout = StringIO()
+        progress = boom.Progress(results, boom.monotonic() - 1,
+                                 stdout=stdout)
+        for i in range(5):
+            results.incr()
+        progress.draw()
+        output = stdout.getvalue()
+        self.assertTrue(output.startswith('\n['), output)
+        self.assertTrue('50% 5 calls' in output, output)
+        self.assertTrue('ETA 1s' in output, output)
+
+    def test_progress_duration(self):
+        results = RunResults(num=None)
+        stdout = StringIO()
+        progress = boom.Progress(results, boom.monotonic() - 3,
+                                 duration=10, stdout=stdout)
+        progress.draw()
+        output = stdout.getvalue()
+        self.assertTrue('30% 0 calls' in output, output)
+        self.assertTrue('ETA 7s' in output, output)
+
     def test_json_output(self):
         results = RunResults()
         results.status_code_counter['200'].extend([0, 0.1, 0.2])
@@ -254,6 +834,13 @@ class TestBoom(unittest.TestCase):
         self.assertEqual(0.2, actual['max'])
         self.assertAlmostEqual(0.1, actual['avg'], delta=0.1)
         self.assertEqual(0.2, actual['amp'])
+        self.assertEqual(['p50', 'p90', 'p95', 'p99', 'p99.9'],
+                         list(actual['percentiles']))
+        self.assertAlmostEqual(0.1, actual['percentiles']['p50'], delta=0.01)
+        self.assertEqual(0.2, actual['percentiles']['p99.9'])
+        self.assertEqual(3, actual['status_codes']['200']['count'])
+        self.assertEqual(actual['percentiles'],
+                         actual['status_codes']['200']['percentiles'])
 
 
 if __name__ == '__main__':
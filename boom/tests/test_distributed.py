@@ -0,0 +1,142 @@
+import json
+import socket
+import unittest
+
+from gevent import sleep
+from gevent.pywsgi import WSGIServer
+from gevent.server import StreamServer
+
+from boom import distributed
+from boom.boom import _agent
+from boom.distributed import (Agent, AgentError, coordinate, dump_options,
+                              load_options, parse_agents)
+from boom.profile import Profile
+from boom.resolver import Resolver, parse_override
+from boom.scenario import Scenario
+from boom.tests.test_boom import App
+
+
+class DistributedTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = App()
+        cls.server = WSGIServer(('127.0.0.1', 0), cls.app.handle, log=None)
+        cls.server.start()
+        cls.url = 'http://127.0.0.1:%d/' % cls.server.server_port
+        cls.agents = [StreamServer(('127.0.0.1', 0), Agent().handle)
+                      for _ in range(3)]
+        for agent in cls.agents:
+            agent.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        for agent in cls.agents:
+            agent.stop()
+        cls.server.stop()
+
+    def setUp(self):
+        self.app.numcalls = 0
+
+    def _agents(self, count=3):
+        return [('127.0.0.1', agent.server_port)
+                for agent in self.agents[:count]]
+
+    def test_parse_agents(self):
+        self.assertEqual(parse_agents('a:9000,b,[::1]:9001'),
+                         [('a', 9000), ('b', 8888), ('::1', 9001)])
+        self.assertRaises(ValueError, parse_agents, 'a:http')
+        self.assertEqual(_agent('9000'), ('127.0.0.1', 9000))
+        self.assertEqual(_agent('0.0.0.0:9000'), ('0.0.0.0', 9000))
+
+    def test_options(self):
+        options = {'profile': Profile.parse('0-10:2,10:3'),
+                   'scenario': Scenario.parse([{'url': 'http://a/'}]),
+                   'resolver': Resolver([parse_override('a:80:b,c')]),
+                   'rate': 5}
+        options = load_options(dump_options(options))
+        self.assertEqual(str(options['profile']), '0-10:2,10:3')
+        self.assertEqual(options['scenario'].entries[0].url, 'http://a/')
+        self.assertEqual(options['resolver'].addresses('a', 80), ['b', 'c'])
+        self.assertEqual(options['rate'], 5)
+
+        for options in ({'url': self.url, 'output_file': '/tmp/calls'},
+                        {'url': self.url, 'report_interval': 1},
+                        {'url': self.url, 'data': ['payload']}):
+            self.assertRaises(ValueError, load_options, options)
+
+    def test_refused_run(self):
+        sock = socket.create_connection(self._agents(1)[0])
+        reader = sock.makefile('rb')
+        try:
+            run = {'url': self.url, 'requests': 1, 'concurrency': 1,
+                   'output_file': '/tmp/calls'}
+            sock.sendall(json.dumps({'run': run}).encode('utf-8') + b'\n')
+            message = json.loads(reader.readline().decode('utf-8'))
+        finally:
+            reader.close()
+            sock.close()
+        self.assertEqual(message, {'error': 'Invalid run: Unsupported '
+                                            'options output_file'})
+        self.assertEqual(self.app.numcalls, 0)
+
+    def test_coordinate(self):
+        res = coordinate(self._agents(), self.url, 10, concurrency=4)
+        self.assertEqual(self.app.numcalls, 10)
+        self.assertEqual(len(res.status_code_counter[200]), 10)
+        self.assertEqual(len(res.errors), 0)
+        self.assertEqual(res.new_connections, 4)
+        self.assertTrue(res.total_time > 0)
+
+        # not enough calls for every agent
+        res = coordinate(self._agents(), self.url, 2, concurrency=4)
+        self.assertEqual(len(res.status_code_counter[200]), 2)
+        self.assertEqual(res.new_connections, 2)
+
+    def test_errors(self):
+        res = coordinate(self._agents(2), 'http://127.0.0.1:1/', 2,
+                         concurrency=2)
+        self.assertEqual(len(res.errors), 2)
+
+        self.assertRaises(AgentError, coordinate, self._agents(2),
+                          self.url, 2, concurrency=2, engine='nope')
+        self.assertRaises(AgentError, coordinate, [('127.0.0.1', 1)],
+                          self.url)
+
+    def test_timeouts(self):
+        def stalled(sock, address):
+            # ready, then silent, or running for ever
+            reader = sock.makefile('rb')
+            try:
+                reader.readline()
+                sock.sendall(b'{"ready": true}\n')
+                reader.readline()
+                while beat:
+                    sock.sendall(b'{"running": true}\n')
+                    sleep(.05)
+                sleep(1)
+            except socket.error:
+                pass
+            finally:
+                reader.close()
+                sock.close()
+
+        server = StreamServer(('127.0.0.1', 0), stalled)
+        server.start()
+        heartbeat, margin = distributed._HEARTBEAT, distributed._RESULTS_MARGIN
+        distributed._HEARTBEAT, distributed._RESULTS_MARGIN = .1, .1
+        try:
+            agents = [('127.0.0.1', server.server_port)]
+            beat = False
+            self.assertRaises(AgentError, coordinate, agents, self.url, 1)
+            beat = True
+            self.assertRaises(AgentError, coordinate, agents, self.url,
+                              None, duration=.1)
+
+            # the running messages of a real agent are skipped
+            res = coordinate(self._agents(1), self.url, None, duration=.5)
+            self.assertTrue(res.total_time >= .5)
+        finally:
+            distributed._HEARTBEAT = heartbeat
+            distributed._RESULTS_MARGIN = margin
+            server.stop()
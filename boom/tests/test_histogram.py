@@ -0,0 +1,67 @@
+import math
+import unittest
+from boom.histogram import Histogram
+
+
+class HistogramTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.values = [0.001 * i for i in range(1, 1001)]
+        self.h = Histogram()
+        self.h.extend(self.values)
+
+    def tearDown(self):
+        del (self.h)
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertEqual(len(h), 0)
+        self.assertEqual(h.min, None)
+        self.assertEqual(h.max, None)
+        self.assertEqual(h.stdev, 0)
+
+    def test_stats(self):
+        mean = sum(self.values) / len(self.values)
+        stdev = math.sqrt(sum((x - mean) ** 2 for x in self.values) /
+                          len(self.values))
+        self.assertEqual(len(self.h), 1000)
+        self.assertAlmostEqual(self.h.sum, sum(self.values))
+        self.assertAlmostEqual(self.h.mean, mean)
+        self.assertAlmostEqual(self.h.stdev, stdev)
+        self.assertEqual(self.h.min, 0.001)
+        self.assertEqual(self.h.max, 1.)
+
+    def test_constant_memory(self):
+        buckets = len(self.h.buckets)
+        self.h.extend(self.values * 10)
+        self.assertEqual(len(self.h.buckets), buckets)
+        self.assertEqual(len(self.h), 11000)
+
+    def test_percentiles(self):
+        p50, p99, p100 = self.h.percentiles([50, 99, 100])
+        self.assertAlmostEqual(p50, 0.5, delta=0.5 * self.h.precision)
+        self.assertAlmostEqual(p99, 0.99, delta=0.99 * self.h.precision)
+        self.assertEqual(p100, 1.)
+        self.assertEqual(self.h.percentile(0.001), 0.001)
+        self.assertEqual(Histogram().percentiles([50, 99]), [0, 0])
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        first.extend(self.values[:300])
+        second.extend(self.values[300:])
+        first.merge(second)
+        self.assertEqual(first.count, self.h.count)
+        self.assertEqual(first.buckets, self.h.buckets)
+        self.assertAlmostEqual(first.mean, self.h.mean)
+        self.assertAlmostEqual(first.stdev, self.h.stdev)
+        self.assertEqual(first.min, self.h.min)
+        self.assertEqual(first.max, self.h.max)
+
+    def test_merge_different_buckets(self):
+        other = Histogram(precision=0.1)
+        other.append(1)
+        self.assertRaises(ValueError, self.h.merge, other)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from gevent import sleep, spawn
+from gevent.server import StreamServer
+
+from boom.boom import run as runboom
+from boom.engines import get_engine
+from boom.http2 import H2Connection
+from boom.util import monotonic
+
+try:
+    from h2.config import H2Configuration
+    from h2.events import DataReceived, RequestReceived, StreamEnded
+    from h2.settings import SettingCodes
+except ImportError:
+    pass
+
+
+class H2Server(object):
+    """Answers h2c calls, echoing the bodies sent to /echo and resetting
+    the streams of /reset. Streams have a small window and only two of
+    them can be open at once."""
+
+    def __init__(self):
+        self.max_streams = 0
+
+    def handle(self, sock, address):
+        conn = H2Connection(H2Configuration(client_side=False,
+                                            header_encoding='latin-1'))
+        conn.initiate_connection()
+        conn.update_settings({SettingCodes.INITIAL_WINDOW_SIZE: 100,
+                              SettingCodes.MAX_CONCURRENT_STREAMS: 2})
+        sock.sendall(conn.data_to_send())
+        calls = {}
+
+        while True:
+            data = sock.recv(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, RequestReceived):
+                    calls[event.stream_id] = (dict(event.headers)[':path'],
+                                              [])
+                    self.max_streams = max(self.max_streams, len(calls))
+                elif isinstance(event, DataReceived):
+                    conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id)
+                    calls[event.stream_id][1].append(event.data)
+                elif isinstance(event, StreamEnded):
+                    path, chunks = calls.pop(event.stream_id)
+                    if path == '/reset':
+                        conn.reset_stream(event.stream_id, 2)
+                        continue
+                    body = b''.join(chunks) if path == '/echo' else b'hello'
+                    conn.send_headers(event.stream_id, [
+                        (':status', '200'),
+                        ('content-length', str(len(body)))])
+                    conn.send_data(event.stream_id, body, end_stream=True)
+            sock.sendall(conn.data_to_send())
+
+
+@unittest.skipIf(H2Connection is None, 'The http2 engine needs h2')
+class HTTP2TestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = H2Server()
+        cls.server = StreamServer(('127.0.0.1', 0), cls.app.handle)
+        cls.server.start()
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_multiplexing(self):
+        run_results = runboom(self.url + '/', num=20, concurrency=10,
+                              quiet=True, engine='http2')
+        self.assertEqual(len(run_results.status_code_counter[200]), 20)
+        self.assertEqual(len(run_results.errors), 0)
+        self.assertEqual(run_results.new_connections, 1)
+        self.assertEqual(run_results.reused_connections, 19)
+        self.assertEqual(run_results.streams['opened'], 20)
+        self.assertEqual(run_results.phases['ttfb'].count, 20)
+        self.assertLessEqual(self.app.max_streams, 2)
+
+        run_results = runboom(self.url + '/', num=20, concurrency=10,
+                              quiet=True, engine='http2',
+                              engine_options={'connections': 2,
+                                              'streams': 1})
+        self.assertEqual(len(run_results.status_code_counter[200]), 20)
+        self.assertEqual(run_results.new_connections, 2)
+
+    def test_slow_connect(self):
+        # a host slow to connect doesn't hold the calls to the others
+        engine = get_engine('http2')
+        connect = engine._connect
+
+        def slow_connect(target):
+            if target[1] == 'localhost':
+                sleep(1)
+            return connect(target)
+
+        engine._connect = slow_connect
+        try:
+            slow = spawn(engine.request, 'GET',
+                         self.url.replace('127.0.0.1', 'localhost') + '/')
+            sleep(0)
+            start = monotonic()
+            response = engine.request('GET', self.url + '/')
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(monotonic() - start, .5)
+            slow.join()
+        finally:
+            engine.close()
+
+    def test_flow_control(self):
+        engine = get_engine('http2')
+        try:
+            response = engine.request('POST', self.url + '/echo',
+                                      data=b'x' * 1000)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'x' * 1000)
+        finally:
+            engine.close()
+
+        run_results = runboom(self.url + '/echo', num=2, method='POST',
+                              data='x' * 1000, quiet=True, engine='http2')
+        self.assertEqual(len(run_results.status_code_counter[200]), 2)
+        self.assertGreater(run_results.streams['stalls'], 0)
+
+    def test_reset(self):
+        run_results = runboom(self.url + '/reset', num=3, quiet=True,
+                              engine='http2')
+        self.assertEqual(len(run_results.errors), 3)
+        self.assertEqual(run_results.streams['reset'], 3)
+
+        run_results = runboom('http://127.0.0.1:1/', quiet=True,
+                              engine='http2')
+        self.assertEqual(len(run_results.errors), 1)
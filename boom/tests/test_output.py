@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+from boom.output import FORMATS, Record, ResultWriter, read
+
+
+class ResultWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.records = [Record(1500000000.5, 0.25, 200, 1024, '', 0),
+                        Record(1500000001.5, 0.5, 0, 0, 'ConnectionError', 3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_formats(self):
+        for fmt in FORMATS:
+            path = os.path.join(self.dir, 'results.%s' % fmt)
+            writer = ResultWriter(path, fmt)
+            for record in self.records:
+                writer.write(*record)
+            writer.close()
+            self.assertEqual(list(read(path, fmt)), self.records)
+
+    def test_batches(self):
+        path = os.path.join(self.dir, 'results.bin')
+        writer = ResultWriter(path, 'binary', batch=2)
+        writer.start()
+        writer.write(*self.records[0])
+        self.assertEqual(os.path.getsize(path), 0)
+        writer.write(*self.records[1])
+        writer.flush()
+        self.assertEqual(list(read(path, 'binary')), self.records)
+        writer.close()
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, ResultWriter,
+                          os.path.join(self.dir, 'results'), 'xml')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+import unittest
+from boom.payload import PayloadPool
+
+
+class PayloadPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name, content in (('a', b'one'), ('b', b''), ('c', b'three')):
+            with open(os.path.join(self.dir, name), 'wb') as f:
+                f.write(content)
+        os.mkdir(os.path.join(self.dir, 'd'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_robin(self):
+        pool = PayloadPool.from_dir(self.dir)
+        self.assertEqual(len(pool), 3)
+        self.assertEqual(pool.size, 8)
+        self.assertEqual([bytes(pool()) for _ in range(4)],
+                         [b'one', b'', b'three', b'one'])
+        self.assertTrue(isinstance(pool('POST', '/', {}), memoryview))
+
+    def test_random(self):
+        pool = PayloadPool.from_dir(self.dir, 'random')
+        for _ in range(10):
+            self.assertTrue(bytes(pool()) in (b'one', b'', b'three'))
+
+    def test_errors(self):
+        self.assertRaises(ValueError, PayloadPool, [])
+        self.assertRaises(ValueError, PayloadPool,
+                          [os.path.join(self.dir, 'a')], 'sorted')
+        self.assertRaises(EnvironmentError, PayloadPool,
+                          [os.path.join(self.dir, 'missing')])
@@ -0,0 +1,69 @@
+import unittest
+from itertools import islice
+
+from boom.profile import Profile, Stage, arrivals
+
+
+class ProfileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.p = Profile.parse('0-100:60,100:120,200:30')
+
+    def tearDown(self):
+        del (self.p)
+
+    def test_parse(self):
+        self.assertEqual(self.p.stages, [Stage(0, 100, 60),
+                                         Stage(100, 100, 120),
+                                         Stage(200, 200, 30)])
+        self.assertEqual(self.p.duration, 210)
+        self.assertEqual(self.p.peak, 200)
+        self.assertEqual(str(self.p), '0-100:60,100:120,200:30')
+
+    def test_invalid(self):
+        for spec in ('', '100', '0-100', 'a:10', '100:0', '-1:10'):
+            self.assertRaises(ValueError, Profile.parse, spec)
+
+    def test_level(self):
+        self.assertEqual(self.p.level(0), 0)
+        self.assertEqual(self.p.level(30), 50)
+        self.assertEqual(self.p.level(60), 100)
+        self.assertEqual(self.p.level(179), 100)
+        self.assertEqual(self.p.level(180), 200)
+        self.assertEqual(self.p.level(1000), 200)
+
+    def test_stage(self):
+        self.assertEqual(self.p.stage(0), 0)
+        self.assertEqual(self.p.stage(60), 1)
+        self.assertEqual(self.p.stage(200), 2)
+        self.assertEqual(self.p.stage(1000), 2)
+
+    def test_ramp(self):
+        p = Profile.ramp(10, 5, 20)
+        self.assertEqual(str(p), '0-10:5,10:15')
+        self.assertEqual(str(Profile.ramp(10, 5, 5)), '0-10:5')
+
+    def test_scaled(self):
+        self.assertEqual(str(self.p.scaled(.5)), '0-50:60,50:120,100:30')
+        self.assertEqual(self.p.scaled(.5).labels, self.p.labels)
+
+    def test_shared(self):
+        profile = Profile.parse('0-5:60,5:120,10:30')
+        parts = [profile.shared(3, index) for index in range(3)]
+        self.assertEqual([str(part) for part in parts],
+                         ['0-2:60,2:120,4:30', '0-2:60,2:120,3:30',
+                          '0-1:60,1:120,3:30'])
+        self.assertEqual(parts[2].labels, ['0-5:60', '5:120', '10:30'])
+
+    def test_arrivals(self):
+        times = list(islice(arrivals(Profile.parse('2:1,0:1,2:1'), 10), 5))
+        self.assertEqual(times, [10, 10.5, 12, 12.5, 13])
+
+        # no more calls once the profile ends at 0
+        times = list(arrivals(Profile.parse('5:1,0:1'), 10))
+        self.assertEqual(len(times), 5)
+        self.assertEqual(list(arrivals(Profile.parse('0:1'), 10)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
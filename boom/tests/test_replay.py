@@ -0,0 +1,64 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from boom.replay import AccessLog, Request, parse_line, timed
+
+
+LOG = '''\
+127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] "GET /a.gif HTTP/1.0" 200 2326
+10.0.0.1 - - [10/Oct/2000:20:55:37 +0000] "POST /login HTTP/1.1" 302 0 \
+"http://example.com/" "Mozilla/5.0"
+not a log line
+10.0.0.2 - - [10/Oct/2000:22:55:39 +0200] "GET /b?q=1 HTTP/1.1" 200 12
+'''
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_line(self):
+        self.assertEqual(parse_line(LOG.splitlines()[0]),
+                         Request(971211336, 'GET', '/a.gif'))
+        self.assertEqual(parse_line(LOG.splitlines()[1]),
+                         Request(971211337, 'POST', '/login'))
+        self.assertEqual(parse_line('not a log line'), None)
+
+    def test_access_log(self):
+        for name, opener in (('access.log', open),
+                             ('access.log.gz', gzip.open)):
+            path = os.path.join(self.dir, name)
+            with opener(path, 'wb') as f:
+                f.write(LOG.encode('ascii'))
+            log = AccessLog(path)
+            self.assertEqual([request.path for request in log],
+                             ['/a.gif', '/login', '/b?q=1'])
+            self.assertEqual(log.skipped, 1)
+            log.check()
+
+        path = os.path.join(self.dir, 'latin1.log')
+        with open(path, 'wb') as f:
+            f.write(LOG.replace('/a.gif', '/caf\xe9').encode('latin-1'))
+        log = AccessLog(path)
+        self.assertEqual(len(list(log)), 3)
+        self.assertEqual(log.skipped, 1)
+
+        self.assertRaises(EnvironmentError,
+                          AccessLog(os.path.join(self.dir, 'missing')).check)
+
+    def test_timed(self):
+        items = [(100, 'a'), (101, 'b'), (103, 'c')]
+        self.assertEqual(list(timed(items, 10.)),
+                         [(10., 'a'), (11., 'b'), (13., 'c')])
+        self.assertEqual(list(timed(items, 10., speed=2)),
+                         [(10., 'a'), (10.5, 'b'), (11.5, 'c')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import socket
+import unittest
+from boom.resolver import Resolver, parse_override
+
+
+class ResolverTestCase(unittest.TestCase):
+
+    def test_parse_override(self):
+        self.assertEqual(parse_override('example.com:443:10.0.0.1'),
+                         (('example.com', 443), ['10.0.0.1']))
+        self.assertEqual(parse_override('example.com:80:10.0.0.1,[::1]'),
+                         (('example.com', 80), ['10.0.0.1', '::1']))
+        for value in ('example.com', 'example.com:http:10.0.0.1',
+                      ':80:10.0.0.1', 'example.com:80:'):
+            self.assertRaises(ValueError, parse_override, value)
+
+    def test_overrides(self):
+        resolver = Resolver(dict([parse_override('example.com:80:a,b,c')]))
+        self.assertEqual(resolver.addresses('example.com', 80),
+                         ['a', 'b', 'c'])
+        self.assertEqual([resolver.pick('example.com', 80)
+                          for _ in range(4)], ['a', 'b', 'c', 'a'])
+
+        resolver = Resolver(resolver.overrides, offset=4)
+        self.assertEqual(resolver.pick('example.com', 80), 'b')
+
+    def test_getaddrinfo(self):
+        resolver = Resolver()
+        self.assertEqual(resolver.addresses('127.0.0.1', 80), ['127.0.0.1'])
+        self.assertRaises(socket.gaierror, resolver.addresses,
+                          'that.impossiblename', 80)
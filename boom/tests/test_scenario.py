@@ -0,0 +1,89 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from boom.scenario import AliasSampler, Mix, Scenario
+
+
+class AliasSamplerTestCase(unittest.TestCase):
+
+    def test_distribution(self):
+        random.seed(1)
+        weights = [8, 2, 1, 0.5]
+        sampler = AliasSampler(weights)
+        counts = Counter(sampler.sample() for _ in range(100000))
+        total = float(sum(weights))
+        for index, weight in enumerate(weights):
+            self.assertAlmostEqual(counts[index] / 100000., weight / total,
+                                   delta=0.01)
+
+    def test_single(self):
+        sampler = AliasSampler([3])
+        self.assertEqual(set(sampler.sample() for _ in range(100)),
+                         set([0]))
+
+    def test_invalid(self):
+        for weights in ([], [0], [1, -1]):
+            self.assertRaises(ValueError, AliasSampler, weights)
+
+    def test_mix(self):
+        mix = Mix(['a', 'b'], [1, 0])
+        self.assertEqual(set(mix.pick() for _ in range(100)), set(['a']))
+
+
+class ScenarioTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data = {'requests': [
+            {'name': 'home', 'url': '/', 'weight': 8},
+            {'url': '/login', 'method': 'post', 'data': 'user=boom',
+             'headers': {'X-Test': '1'}}]}
+
+    def test_parse(self):
+        scenario = Scenario.parse(self.data, 'http://localhost:8080/app/')
+        self.assertEqual(len(scenario), 2)
+        home, login = scenario.entries
+        self.assertEqual(home.name, 'home')
+        self.assertEqual(home.url, 'http://localhost:8080/')
+        self.assertEqual(home.method, 'GET')
+        self.assertEqual(home.weight, 8)
+        self.assertEqual(login.name, 'POST /login')
+        self.assertEqual(login.method, 'POST')
+        self.assertEqual(login.data, 'user=boom')
+        self.assertEqual(login.headers, {'X-Test': '1'})
+        self.assertEqual(login.weight, 1)
+
+        scenario = Scenario.parse(self.data['requests'])
+        self.assertEqual(scenario.entries[0].url, '/')
+
+    def test_invalid(self):
+        for data in ({}, [], [{'name': 'no url'}],
+                     [{'url': '/'}, {'url': '/'}],
+                     [{'url': '/', 'weight': 0}],
+                     [{'url': '/', 'data': {'user': 'boom'}}],
+                     [{'url': '/', 'data': 1}],
+                     [{'url': 1}],
+                     [{'url': '/', 'method': 'FETCH'}],
+                     [{'url': '/', 'method': 1}],
+                     [{'url': '/', 'headers': ['Accept: */*']}],
+                     [{'url': '/', 'headers': {'X-Count': 1}}]):
+            self.assertRaises(ValueError, Scenario.parse, data)
+
+    def test_load(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'scenario.json')
+            with open(path, 'w') as f:
+                json.dump(self.data, f)
+            scenario = Scenario.load(path, 'http://localhost/')
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual([entry.name for entry in scenario.entries],
+                         ['home', 'POST /login'])
+
+
+if __name__ == '__main__':
+    unittest.main()
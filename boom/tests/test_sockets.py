@@ -0,0 +1,81 @@
+import errno
+import socket
+import unittest
+
+from gevent.server import StreamServer
+from requests import ConnectionError
+
+from boom.bench import _respond
+from boom.boom import run as runboom
+from boom.results import RunResults, calc_stats
+from boom.sockets import SocketOptions, is_exhaustion
+
+
+class SocketsTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.peers = []
+        cls.server = StreamServer(('0.0.0.0', 0), cls._handle)
+        cls.server.start()
+        cls.url = 'http://127.0.0.1:%d/' % cls.server.server_port
+
+    @classmethod
+    def _handle(cls, sock, address):
+        cls.peers.append(address[0])
+        _respond(sock, address)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        del self.peers[:]
+
+    def test_options(self):
+        options = SocketOptions(['127.0.0.1', '127.0.0.2'], reuseaddr=True,
+                                linger=0)
+        self.assertEqual([level_name[:2] for level_name in options.options],
+                         [(socket.IPPROTO_TCP, socket.TCP_NODELAY),
+                          (socket.SOL_SOCKET, socket.SO_REUSEADDR),
+                          (socket.SOL_SOCKET, socket.SO_LINGER)])
+        self.assertEqual([options.source() for _ in range(3)],
+                         [('127.0.0.1', 0), ('127.0.0.2', 0),
+                          ('127.0.0.1', 0)])
+        self.assertEqual(SocketOptions(nodelay=False).options, [])
+        self.assertEqual(SocketOptions().source(), None)
+
+        options.check()
+        self.assertRaises(socket.error,
+                          SocketOptions(['192.0.2.1']).check)
+
+    def test_source_addresses(self):
+        sockets = {'source_addresses': ['127.0.0.1', '127.0.0.2'],
+                   'linger': 0}
+        for engine in ('requests', 'urllib3', 'socket'):
+            del self.peers[:]
+            res = runboom(self.url, num=4, quiet=True, keepalive=False,
+                          engine=engine,
+                          engine_options={'sockets': sockets})
+            self.assertEqual(len(res.status_code_counter[200]), 4, engine)
+            self.assertEqual(sorted(self.peers), ['127.0.0.1', '127.0.0.1',
+                                                  '127.0.0.2', '127.0.0.2'],
+                             engine)
+
+    def test_exhaustion(self):
+        error = socket.error(errno.EADDRNOTAVAIL,
+                             'Cannot assign requested address')
+        self.assertTrue(is_exhaustion(error))
+        self.assertTrue(is_exhaustion(ConnectionError(
+            'Failed to establish a new connection: %s' % error)))
+        self.assertFalse(is_exhaustion(ConnectionError(
+            'Failed to establish a new connection: [Errno %d] Connection '
+            'refused' % errno.ECONNREFUSED)))
+
+        res = RunResults()
+        res.record_error(ConnectionError('[Errno %d] Too many open files'
+                                         % errno.EMFILE))
+        res.record_error(ConnectionError('Connection refused'))
+        self.assertEqual(calc_stats(res).client_errors, 1)
+        res = RunResults.from_dict(res.to_dict())
+        self.assertEqual(calc_stats(res).client_errors, 1)
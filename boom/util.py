@@ -6,6 +6,11 @@ if sys.version_info[0] < 3:
 else:
     PY3 = True
 
+try:
+    from time import monotonic                  # NOQA
+except ImportError:
+    from time import time as monotonic          # NOQA
+
 try:
     from importlib import import_module         # NOQA
 except ImportError:
@@ -132,3 +137,25 @@ def resolve_name(import_name, silent=False):
     except ImportError as e:
         if not silent:
             raise ImportStringError(import_name, e)
+
+
+_patched = []
+
+
+def share(total, parts, index):
+    """Returns the share of *total* given to the part *index* of
+    *parts*."""
+    return total // parts + (1 if index < total % parts else 0)
+
+
+def patch():
+    """Monkey patches the standard library for gevent, once.
+
+    The gevent backend needs it, and calls it when it starts. Programs
+    importing boom should call it themselves, as early as possible, so
+    that nothing grabs an unpatched socket or lock before.
+    """
+    if not _patched:
+        from gevent import monkey
+        monkey.patch_all()
+        _patched.append(True)
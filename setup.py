@@ -40,4 +40,5 @@ setup(name='boom',
       entry_points="""
       [console_scripts]
       boom = boom.boom:main
+      boom-bench = boom.bench:main
       """)